@@ -1,11 +1,12 @@
 from flask import Flask
 from flask_socketio import SocketIO
-from backend.database import init_db
+from backend.database import init_db, release_db_connections, start_counter_reconcile
 from backend.scanner import NetworkScanner
 from config import Config
 from routes import register_blueprints
 from socketio_events import register_socketio_events
 from services.realtime_monitor import RealtimeMonitor
+from services.device_state import DeviceStateCache
 
 # Initialize Flask app
 app = Flask(__name__, 
@@ -18,16 +19,25 @@ socketio = SocketIO(app, cors_allowed_origins="*", async_mode='eventlet')
 
 # Initialize core services
 init_db()
+start_counter_reconcile()
 scanner = NetworkScanner()
-realtime_monitor = RealtimeMonitor(socketio, scanner)
+device_state = DeviceStateCache()
+device_state.load()
+realtime_monitor = RealtimeMonitor(socketio, scanner, device_state)
 
 app.scanner = scanner
+app.device_state = device_state
 app.realtime_monitor = realtime_monitor
 
 # Register all routes and events
 register_blueprints(app)
 register_socketio_events(socketio, realtime_monitor, scanner)
 
+# Return any database connections a request left open to the pool
+@app.teardown_appcontext
+def release_db(exception):
+    release_db_connections()
+
 # Error handlers
 @app.errorhandler(404)
 def not_found_error(error):
@@ -5,8 +5,8 @@ This package contains the core backend functionality for the HomeTier,
 including database operations, network scanning, and device management.
 """
 
-from .database import init_db, get_db_connection, add_device
+from .database import init_db, get_db_connection, add_device, add_devices
 from .scanner import NetworkScanner
 
 __version__ = "1.0.0"
-__all__ = ["init_db", "get_db_connection", "add_device", "NetworkScanner"]
\ No newline at end of file
+__all__ = ["init_db", "get_db_connection", "add_device", "add_devices", "NetworkScanner"]
\ No newline at end of file
@@ -1,18 +1,152 @@
 import sqlite3
+import threading
+import time
+import weakref
 from pathlib import Path
 from config import Config
 from datetime import datetime
 
+# Max parameters per IN (...) list, well under SQLite's variable limit
+SQL_BATCH_SIZE = 500
+
+try:
+    # Under eventlet, concurrent requests are greenlets sharing one OS thread
+    from greenlet import getcurrent as _current_task
+except ImportError:
+    _current_task = threading.current_thread
+
+class PooledConnection(sqlite3.Connection):
+    """SQLite connection whose close() hands it back to the pool instead of closing it"""
+    
+    def close(self):
+        _pool.release(self)
+    
+    def discard(self):
+        """Really close the underlying connection"""
+        super().close()
+
+class ConnectionPool:
+    """Pool of open WAL-mode connections shared by all threads and greenlets
+    
+    A connection is only ever checked out by one caller at a time. Checkouts
+    are tracked per greenlet (per thread when greenlet is not installed), so
+    anything left open (e.g. on an exception path) can be returned at the end
+    of a request without touching connections other requests are using.
+    """
+    
+    def __init__(self, max_idle):
+        self.max_idle = max_idle
+        self._idle = []
+        self._lock = threading.Lock()
+        self._checkouts = weakref.WeakKeyDictionary()  # greenlet/thread -> connections
+    
+    def _checked_out(self):
+        task = _current_task()
+        with self._lock:
+            connections = self._checkouts.get(task)
+            if connections is None:
+                connections = self._checkouts[task] = []
+            return connections
+    
+    def _connect(self):
+        conn = sqlite3.connect(
+            Config.DATABASE_PATH,
+            timeout=Config.DB_BUSY_TIMEOUT / 1000,
+            factory=PooledConnection,
+            check_same_thread=False
+        )
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(f'PRAGMA synchronous={Config.DB_SYNCHRONOUS}')
+        conn.execute(f'PRAGMA cache_size={-Config.DB_CACHE_SIZE_KB}')
+        conn.execute(f'PRAGMA mmap_size={Config.DB_MMAP_SIZE}')
+        conn.execute(f'PRAGMA busy_timeout={Config.DB_BUSY_TIMEOUT}')
+        return conn
+    
+    def acquire(self):
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = self._connect()
+        
+        conn.row_factory = sqlite3.Row
+        conn.pooled_idle = False
+        conn.pooled_owner = self._checked_out()
+        conn.pooled_owner.append(conn)
+        return conn
+    
+    def release(self, conn):
+        if getattr(conn, 'pooled_idle', True):
+            return  # Already returned
+        conn.pooled_idle = True
+        
+        # Closed by whoever holds it, which need not be the greenlet that checked it out
+        if conn in conn.pooled_owner:
+            conn.pooled_owner.remove(conn)
+        
+        try:
+            # Never hand out a connection with someone else's open transaction
+            if conn.in_transaction:
+                conn.rollback()
+            if getattr(conn, 'snapshot', False):
+                conn.execute('PRAGMA query_only=OFF')
+                conn.snapshot = False
+        except sqlite3.Error:
+            conn.discard()
+            return
+        
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.discard()
+    
+    def release_all(self):
+        """Return every connection the current greenlet/thread still has checked out"""
+        for conn in list(self._checked_out()):
+            self.release(conn)
+
+_pool = ConnectionPool(Config.DB_POOL_SIZE)
+
 def get_db_connection():
-    """Get database connection"""
-    conn = sqlite3.connect(Config.DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
+    """Get a pooled database connection; close() returns it to the pool"""
+    return _pool.acquire()
+
+def get_snapshot_connection():
+    """Get a pooled read-only connection pinned to one consistent snapshot
+
+    The read transaction starts immediately, so every query on the connection
+    sees the database as it was at this moment, however long the caller takes.
+    Under WAL this never blocks (or is blocked by) scanner writes. Keep the
+    snapshot short-lived where possible: checkpoints cannot move past an open
+    reader. close() ends the snapshot and returns the connection to the pool.
+    """
+    conn = _pool.acquire()
+    conn.snapshot = True
+    conn.execute('PRAGMA query_only=ON')
+    conn.execute('BEGIN')
+    conn.execute('SELECT 1 FROM sqlite_master LIMIT 1')  # Take the snapshot now, not on first use
     return conn
 
-def init_db():
-    """Initialize database with required tables"""
-    conn = get_db_connection()
-    
+def epoch_ago(seconds):
+    """Unix time the given number of seconds ago, for comparing with the *_ts columns"""
+    return int(time.time()) - seconds
+
+def release_db_connections():
+    """Return connections left open by the current request to the pool"""
+    _pool.release_all()
+
+def _column_exists(conn, table, column):
+    return any(row['name'] == column for row in conn.execute(f'PRAGMA table_info({table})'))
+
+def _add_column(conn, table, column, definition):
+    """Add a column unless it is already there (databases created before versioning)"""
+    if _column_exists(conn, table, column):
+        return False
+    conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+    return True
+
+def _migrate_base_schema(conn):
+    """Core tables and the default categories"""
     # Devices table
     conn.execute('''
         CREATE TABLE IF NOT EXISTS devices (
@@ -30,7 +164,7 @@ def init_db():
         )
     ''')
     
-    # Categories table - NEW
+    # Categories table
     conn.execute('''
         CREATE TABLE IF NOT EXISTS categories (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -70,19 +204,9 @@ def init_db():
         )
     ''')
     
-    # Add deleted_at column if it doesn't exist
-    try:
-        conn.execute('ALTER TABLE inventory ADD COLUMN deleted_at TIMESTAMP DEFAULT NULL')
-        print("Migration: Added deleted_at column to inventory table")
-    except Exception:
-        pass
-    
-    # Add category_id column if it doesn't exist
-    try:
-        conn.execute('ALTER TABLE inventory ADD COLUMN category_id INTEGER REFERENCES categories(id)')
-        print("Migration: Added category_id column to inventory table")
-    except Exception:
-        pass
+    # Columns added after the first release
+    _add_column(conn, 'inventory', 'deleted_at', 'TIMESTAMP DEFAULT NULL')
+    _add_column(conn, 'inventory', 'category_id', 'INTEGER REFERENCES categories(id)')
     
     # Device relationships table
     conn.execute('''
@@ -122,49 +246,609 @@ def init_db():
         ('Appliance', 'Home appliances and equipment', 'fas fa-blender', '#6c757d', 1),
         ('Other', 'Other uncategorized devices', 'fas fa-question', '#adb5bd', 1)
     ]
+    conn.executemany('''
+        INSERT OR IGNORE INTO categories (name, description, icon, color, is_default)
+        VALUES (?, ?, ?, ?, ?)
+    ''', default_categories)
+
+def _migrate_hostname_cache(conn):
+    """Hostname lookup cache (hostname NULL = lookup found no name)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS hostname_cache (
+            mac_address TEXT PRIMARY KEY,
+            ip_address TEXT,
+            hostname TEXT,
+            resolved_at INTEGER NOT NULL
+        )
+    ''')
+
+def _migrate_timestamp_indexes(conn):
+    """Epoch copies of the timestamp columns, kept in sync by triggers, and secondary indexes
     
-    for name, description, icon, color, is_default in default_categories:
-        try:
-            conn.execute('''
-                INSERT OR IGNORE INTO categories (name, description, icon, color, is_default)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (name, description, icon, color, is_default))
-        except Exception as e:
-            print(f"Warning: Could not insert default category {name}: {e}")
+    The integer columns let time-window queries use plain indexed range
+    comparisons instead of wrapping the text columns in datetime().
+    """
+    timestamp_columns = [
+        ('devices', 'first_seen_ts', 'first_seen'),
+        ('devices', 'last_seen_ts', 'last_seen'),
+        ('inventory', 'created_at_ts', 'created_at'),
+    ]
+    for table, column, source in timestamp_columns:
+        _add_column(conn, table, column, 'INTEGER')
+        conn.execute(f"UPDATE {table} SET {column} = CAST(strftime('%s', {source}) AS INTEGER) WHERE {column} IS NULL")
     
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS devices_seen_ts_insert AFTER INSERT ON devices
+        BEGIN
+            UPDATE devices SET
+                first_seen_ts = CAST(strftime('%s', NEW.first_seen) AS INTEGER),
+                last_seen_ts = CAST(strftime('%s', NEW.last_seen) AS INTEGER)
+            WHERE id = NEW.id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS devices_seen_ts_update AFTER UPDATE OF first_seen, last_seen ON devices
+        BEGIN
+            UPDATE devices SET
+                first_seen_ts = CAST(strftime('%s', NEW.first_seen) AS INTEGER),
+                last_seen_ts = CAST(strftime('%s', NEW.last_seen) AS INTEGER)
+            WHERE id = NEW.id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS inventory_created_ts_insert AFTER INSERT ON inventory
+        BEGIN
+            UPDATE inventory SET created_at_ts = CAST(strftime('%s', NEW.created_at) AS INTEGER)
+            WHERE id = NEW.id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS inventory_created_ts_update AFTER UPDATE OF created_at ON inventory
+        BEGIN
+            UPDATE inventory SET created_at_ts = CAST(strftime('%s', NEW.created_at) AS INTEGER)
+            WHERE id = NEW.id;
+        END
+    ''')
+    
+    # inventory.device_id is already indexed by its UNIQUE constraint
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_devices_last_seen ON devices (last_seen_ts)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_devices_first_seen ON devices (first_seen_ts)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_inventory_deleted_created ON inventory (deleted_at, created_at_ts)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_inventory_category ON inventory (category_id)')
+
+# Source-of-truth queries for each materialized counter, used to seed and reconcile stats_counters
+COUNTER_QUERIES = {
+    'devices_total': 'SELECT COUNT(*) FROM devices',
+    'devices_ignored': 'SELECT COUNT(*) FROM devices WHERE is_ignored = 1',
+    'devices_managed': '''
+        SELECT COUNT(*) FROM devices d
+        INNER JOIN inventory i ON d.id = i.device_id
+        WHERE i.deleted_at IS NULL
+    ''',
+    'devices_managed_ignored': '''
+        SELECT COUNT(*) FROM devices d
+        INNER JOIN inventory i ON d.id = i.device_id
+        WHERE i.deleted_at IS NULL AND d.is_ignored = 1
+    ''',
+    'inventory_items': 'SELECT COUNT(*) FROM inventory WHERE deleted_at IS NULL',
+    'inventory_networked': 'SELECT COUNT(*) FROM inventory WHERE deleted_at IS NULL AND device_id IS NOT NULL',
+    'inventory_priced': '''
+        SELECT COUNT(*) FROM inventory
+        WHERE deleted_at IS NULL AND price IS NOT NULL AND CAST(price as REAL) > 0
+    ''',
+    'inventory_value': 'SELECT COALESCE(SUM(CAST(price as REAL)), 0) FROM inventory WHERE deleted_at IS NULL',
+    'categories_total': 'SELECT COUNT(*) FROM categories',
+}
+
+# Per-category totals; uncategorized items are counted under category_id 0
+CATEGORY_COUNTER_QUERY = '''
+    SELECT COALESCE(category_id, 0) as category_id,
+           COUNT(*) as item_count,
+           COALESCE(SUM(CAST(price as REAL)), 0) as total_value
+    FROM inventory
+    WHERE deleted_at IS NULL
+    GROUP BY COALESCE(category_id, 0)
+'''
+
+def _inventory_counter_sql(row, sign):
+    """Trigger statements adding (sign '+') or removing (sign '-') one inventory row's share of the counters"""
+    return f'''
+            UPDATE stats_counters SET value = value {sign} CASE name
+                WHEN 'inventory_items' THEN 1
+                WHEN 'inventory_value' THEN COALESCE(CAST({row}.price as REAL), 0)
+                WHEN 'inventory_networked' THEN {row}.device_id IS NOT NULL
+                WHEN 'inventory_priced' THEN ({row}.price IS NOT NULL AND CAST({row}.price as REAL) > 0)
+                WHEN 'devices_managed' THEN EXISTS (SELECT 1 FROM devices WHERE id = {row}.device_id)
+                WHEN 'devices_managed_ignored' THEN EXISTS (SELECT 1 FROM devices WHERE id = {row}.device_id AND is_ignored = 1)
+            END
+            WHERE {row}.deleted_at IS NULL AND name IN (
+                'inventory_items', 'inventory_value', 'inventory_networked',
+                'inventory_priced', 'devices_managed', 'devices_managed_ignored'
+            );
+            INSERT INTO category_counters (category_id, item_count, total_value)
+            SELECT COALESCE({row}.category_id, 0), {sign}1, {sign}COALESCE(CAST({row}.price as REAL), 0)
+            WHERE {row}.deleted_at IS NULL
+            ON CONFLICT(category_id) DO UPDATE SET
+                item_count = item_count + excluded.item_count,
+                total_value = total_value + excluded.total_value;
+    '''
+
+def _write_counters(conn):
+    """Recompute every counter from the source tables; returns {name: (stored, actual)} for any that drifted"""
+    drift = {}
+    stored = {row['name']: row['value'] for row in conn.execute('SELECT name, value FROM stats_counters')}
+    for name, query in COUNTER_QUERIES.items():
+        actual = conn.execute(query).fetchone()[0]
+        if name not in stored or abs(stored[name] - actual) > 0.005:
+            drift[name] = (stored.get(name), actual)
+    
+    conn.executemany(
+        'INSERT OR REPLACE INTO stats_counters (name, value) VALUES (?, ?)',
+        [(name, conn.execute(query).fetchone()[0]) for name, query in COUNTER_QUERIES.items()]
+    )
+    
+    stored_categories = {row['category_id']: (row['item_count'], row['total_value'])
+                         for row in conn.execute('SELECT * FROM category_counters')}
+    actual_categories = {row['category_id']: (row['item_count'], row['total_value'])
+                         for row in conn.execute(CATEGORY_COUNTER_QUERY)}
+    for category_id in stored_categories.keys() | actual_categories.keys():
+        stored_count, stored_value = stored_categories.get(category_id, (0, 0))
+        actual_count, actual_value = actual_categories.get(category_id, (0, 0))
+        if stored_count != actual_count or abs(stored_value - actual_value) > 0.005:
+            drift[f'category_{category_id}'] = (stored_count, actual_count)
+    
+    conn.execute('DELETE FROM category_counters')
+    conn.executemany(
+        'INSERT INTO category_counters (category_id, item_count, total_value) VALUES (?, ?, ?)',
+        [(category_id, count, value) for category_id, (count, value) in actual_categories.items()]
+    )
+    return drift
+
+def _migrate_counters(conn):
+    """Materialized counters for the dashboard and stats endpoints, maintained by triggers"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS stats_counters (
+            name TEXT PRIMARY KEY,
+            value NUMERIC NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS category_counters (
+            category_id INTEGER PRIMARY KEY,
+            item_count INTEGER NOT NULL DEFAULT 0,
+            total_value NUMERIC NOT NULL DEFAULT 0
+        )
+    ''')
+    
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS inventory_counters_insert AFTER INSERT ON inventory
+        BEGIN {_inventory_counter_sql('NEW', '+')}
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS inventory_counters_delete AFTER DELETE ON inventory
+        BEGIN {_inventory_counter_sql('OLD', '-')}
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS inventory_counters_update
+        AFTER UPDATE OF deleted_at, price, device_id, category_id ON inventory
+        BEGIN {_inventory_counter_sql('OLD', '-')} {_inventory_counter_sql('NEW', '+')}
+        END
+    ''')
+    
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS devices_counters_insert AFTER INSERT ON devices
+        BEGIN
+            UPDATE stats_counters SET value = value + 1 WHERE name = 'devices_total';
+            UPDATE stats_counters SET value = value + 1 WHERE name = 'devices_ignored' AND NEW.is_ignored = 1;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS devices_counters_delete AFTER DELETE ON devices
+        BEGIN
+            UPDATE stats_counters SET value = value - CASE name
+                WHEN 'devices_total' THEN 1
+                WHEN 'devices_ignored' THEN OLD.is_ignored = 1
+                WHEN 'devices_managed' THEN EXISTS (
+                    SELECT 1 FROM inventory WHERE device_id = OLD.id AND deleted_at IS NULL)
+                WHEN 'devices_managed_ignored' THEN OLD.is_ignored = 1 AND EXISTS (
+                    SELECT 1 FROM inventory WHERE device_id = OLD.id AND deleted_at IS NULL)
+            END
+            WHERE name IN ('devices_total', 'devices_ignored', 'devices_managed', 'devices_managed_ignored');
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS devices_counters_ignore AFTER UPDATE OF is_ignored ON devices
+        WHEN (OLD.is_ignored = 1) IS NOT (NEW.is_ignored = 1)
+        BEGIN
+            UPDATE stats_counters SET value = value + ((NEW.is_ignored = 1) - (OLD.is_ignored = 1)) * CASE name
+                WHEN 'devices_ignored' THEN 1
+                WHEN 'devices_managed_ignored' THEN EXISTS (
+                    SELECT 1 FROM inventory WHERE device_id = NEW.id AND deleted_at IS NULL)
+            END
+            WHERE name IN ('devices_ignored', 'devices_managed_ignored');
+        END
+    ''')
+    
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS categories_counters_insert AFTER INSERT ON categories
+        BEGIN
+            UPDATE stats_counters SET value = value + 1 WHERE name = 'categories_total';
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS categories_counters_delete AFTER DELETE ON categories
+        BEGIN
+            UPDATE stats_counters SET value = value - 1 WHERE name = 'categories_total';
+            DELETE FROM category_counters WHERE category_id = OLD.id AND item_count = 0;
+        END
+    ''')
+    
+    _write_counters(conn)
+
+def _migrate_inventory_search(conn):
+    """FTS5 index for inventory search, kept in sync with inventory and device hostnames by triggers
+    
+    Rows are keyed by inventory id. Soft-deleted items stay indexed and are
+    filtered out by the search query, so delete/restore needs no index work.
+    """
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS inventory_fts USING fts5(
+            name, brand, model, serial_number, notes, hostname,
+            tokenize = 'unicode61'
+        )
+    ''')
+    
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS inventory_fts_insert AFTER INSERT ON inventory
+        BEGIN
+            INSERT INTO inventory_fts (rowid, name, brand, model, serial_number, notes, hostname)
+            VALUES (NEW.id, NEW.name, NEW.brand, NEW.model, NEW.serial_number, NEW.notes,
+                    (SELECT hostname FROM devices WHERE id = NEW.device_id));
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS inventory_fts_update
+        AFTER UPDATE OF name, brand, model, serial_number, notes, device_id ON inventory
+        BEGIN
+            DELETE FROM inventory_fts WHERE rowid = OLD.id;
+            INSERT INTO inventory_fts (rowid, name, brand, model, serial_number, notes, hostname)
+            VALUES (NEW.id, NEW.name, NEW.brand, NEW.model, NEW.serial_number, NEW.notes,
+                    (SELECT hostname FROM devices WHERE id = NEW.device_id));
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS inventory_fts_delete AFTER DELETE ON inventory
+        BEGIN
+            DELETE FROM inventory_fts WHERE rowid = OLD.id;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS devices_fts_hostname AFTER UPDATE OF hostname ON devices
+        WHEN OLD.hostname IS NOT NEW.hostname
+        BEGIN
+            UPDATE inventory_fts SET hostname = NEW.hostname
+            WHERE rowid IN (SELECT id FROM inventory WHERE device_id = NEW.id);
+        END
+    ''')
+    
+    conn.execute('DELETE FROM inventory_fts')
+    conn.execute('''
+        INSERT INTO inventory_fts (rowid, name, brand, model, serial_number, notes, hostname)
+        SELECT i.id, i.name, i.brand, i.model, i.serial_number, i.notes, d.hostname
+        FROM inventory i
+        LEFT JOIN devices d ON i.device_id = d.id
+    ''')
+
+def _migrate_monitor_cursors(conn):
+    """Persistent high-water marks for the realtime monitor"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS monitor_cursors (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+    ''')
+    
+    # Devices that already exist have been announced by the old time-window check
+    conn.execute('''
+        INSERT OR IGNORE INTO monitor_cursors (name, value)
+        SELECT 'new_devices', COALESCE(MAX(id), 0) FROM devices
+    ''')
+
+# Ordered schema migrations: (version, description, function). Append new
+# steps to the end; never renumber or edit a step that has shipped.
+MIGRATIONS = [
+    (1, 'base schema', _migrate_base_schema),
+    (2, 'hostname cache', _migrate_hostname_cache),
+    (3, 'epoch timestamps and indexes', _migrate_timestamp_indexes),
+    (4, 'materialized counters', _migrate_counters),
+    (5, 'inventory full-text search', _migrate_inventory_search),
+    (6, 'monitor cursors', _migrate_monitor_cursors),
+]
+
+def get_schema_version(conn):
+    """Highest applied migration, or 0 for a new (or pre-versioning) database"""
+    try:
+        return conn.execute('SELECT MAX(version) FROM schema_version').fetchone()[0] or 0
+    except sqlite3.OperationalError:
+        return 0
+
+def init_db():
+    """Bring the database schema up to date
+    
+    A single version check skips everything already applied, so a current
+    database costs one query at startup. Each pending migration runs once,
+    in its own transaction, and is recorded in schema_version.
+    """
+    conn = get_db_connection()
+    try:
+        current = get_schema_version(conn)
+        latest = MIGRATIONS[-1][0]
+        if current >= latest:
+            print(f"Database schema is up to date (version {current})")
+            return
+        
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                duration_ms REAL
+            )
+        ''')
+        
+        for version, description, migrate in MIGRATIONS:
+            if version <= current:
+                continue
+            
+            started = time.perf_counter()
+            conn.execute('BEGIN')
+            try:
+                migrate(conn)
+                duration_ms = (time.perf_counter() - started) * 1000
+                conn.execute(
+                    'INSERT INTO schema_version (version, description, duration_ms) VALUES (?, ?, ?)',
+                    (version, description, duration_ms)
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                print(f"Migration {version} ({description}) failed - rolled back")
+                raise
+            print(f"Migration {version} ({description}) applied in {duration_ms:.1f} ms")
+        
+        print(f"Database schema migrated from version {current} to {latest}")
+    finally:
+        conn.close()
+
+def get_counters(conn=None):
+    """Read the materialized counters as a {name: value} dict"""
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_connection()
+    try:
+        return {row['name']: row['value'] for row in conn.execute('SELECT name, value FROM stats_counters')}
+    finally:
+        if own_conn:
+            conn.close()
+
+def get_category_counters(conn):
+    """Read the per-category item counts and values as {category_id: row}; uncategorized is 0"""
+    return {row['category_id']: row for row in conn.execute('SELECT * FROM category_counters')}
+
+def reconcile_counters():
+    """Recompute the materialized counters from the source tables, fixing and logging any drift"""
+    conn = get_db_connection()
+    try:
+        # IMMEDIATE holds off other writers between reading the truth and storing it
+        conn.execute('BEGIN IMMEDIATE')
+        drift = _write_counters(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    
+    if drift:
+        print(f"Counter reconcile corrected {len(drift)} value(s): {drift}")
+    return drift
+
+def start_counter_reconcile(interval=None):
+    """Periodically reconcile the materialized counters in a background thread"""
+    if interval is None:
+        interval = Config.COUNTER_RECONCILE_INTERVAL
+    
+    def reconcile_loop():
+        while True:
+            time.sleep(interval)
+            try:
+                reconcile_counters()
+            except Exception as e:
+                print(f"Error reconciling counters: {e}")
+    
+    reconcile_thread = threading.Thread(target=reconcile_loop, daemon=True)
+    reconcile_thread.start()
+    return reconcile_thread
+
+def get_monitor_cursor(name):
+    """Read a persisted monitor high-water mark (0 if it was never set)"""
+    conn = get_db_connection()
+    row = conn.execute('SELECT value FROM monitor_cursors WHERE name = ?', (name,)).fetchone()
+    conn.close()
+    return row['value'] if row else 0
+
+def set_monitor_cursor(name, value):
+    conn = get_db_connection()
+    conn.execute(
+        'INSERT INTO monitor_cursors (name, value) VALUES (?, ?) '
+        'ON CONFLICT(name) DO UPDATE SET value = excluded.value',
+        (name, value)
+    )
     conn.commit()
     conn.close()
-    print("Database initialized successfully")
+
+# Callbacks run with the ids of devices after they are saved or edited
+_device_listeners = []
+
+def add_device_listener(callback):
+    """Register callback(device_ids) to hear about saved or edited devices"""
+    _device_listeners.append(callback)
+
+def notify_devices_changed(device_ids):
+    """Tell the device listeners that these devices changed (call after commit)"""
+    for listener in _device_listeners:
+        try:
+            listener(device_ids)
+        except Exception as e:
+            print(f"Error in device listener: {e}")
 
 def add_device(mac_address, ip_address=None, hostname=None, vendor=None):
     """Add or update device in database"""
-    conn = get_db_connection()
+    result = add_devices([{
+        'mac': mac_address,
+        'ip': ip_address,
+        'hostname': hostname,
+        'vendor': vendor
+    }])
+    return result[0]['id']
+
+def add_devices(devices):
+    """Add or update a whole scan result in one transaction
     
-    # Check if device exists
-    existing = conn.execute(
-        'SELECT id FROM devices WHERE mac_address = ?', 
-        (mac_address,)
-    ).fetchone()
+    Takes scanner device dicts ('mac', 'ip', 'hostname', 'vendor'), updating
+    devices whose mac_address is already stored and inserting the rest. Returns one {'mac_address', 'id', 'action'} dict
+    per unique MAC, where action is 'inserted' or 'updated'.
+    """
+    rows = {}
+    for device in devices:
+        if device.get('mac'):
+            rows[device['mac']] = (device['mac'], device.get('ip'), device.get('hostname'), device.get('vendor'))
     
-    if existing:
-        # Update existing device
-        conn.execute('''
-            UPDATE devices 
-            SET ip_address = ?, hostname = ?, vendor = ?, last_seen = CURRENT_TIMESTAMP
-            WHERE mac_address = ?
-        ''', (ip_address, hostname, vendor, mac_address))
-        device_id = existing['id']
-    else:
-        # Insert new device
-        cursor = conn.execute('''
+    if not rows:
+        return []
+    
+    macs = list(rows)
+    conn = get_db_connection()
+    
+    try:
+        # Take the write lock first so no other writer can add one of these
+        # MACs between the lookup and the upsert
+        conn.execute('BEGIN IMMEDIATE')
+        existing = set()
+        for i in range(0, len(macs), SQL_BATCH_SIZE):
+            batch = macs[i:i + SQL_BATCH_SIZE]
+            placeholders = ','.join(['?' for _ in batch])
+            existing.update(row['mac_address'] for row in conn.execute(
+                f'SELECT mac_address FROM devices WHERE mac_address IN ({placeholders})', batch
+            ))
+        
+        # Known MACs are updated in place so rescans don't use up AUTOINCREMENT
+        # ids. Keep a stored hostname while a lookup is pending, and a known
+        # vendor over 'Unknown' from a scan that ran before the full OUI index loaded
+        conn.executemany('''
+            UPDATE devices SET
+                ip_address = ?1,
+                hostname = COALESCE(?2, hostname),
+                vendor = CASE
+                    WHEN ?3 IS NULL OR ?3 = 'Unknown'
+                    THEN COALESCE(vendor, ?3)
+                    ELSE ?3
+                END,
+                last_seen = CURRENT_TIMESTAMP
+            WHERE mac_address = ?4
+        ''', [(ip, hostname, vendor, mac) for mac, ip, hostname, vendor in rows.values() if mac in existing])
+        
+        conn.executemany('''
             INSERT INTO devices (mac_address, ip_address, hostname, vendor)
             VALUES (?, ?, ?, ?)
-        ''', (mac_address, ip_address, hostname, vendor))
-        device_id = cursor.lastrowid
+        ''', [row for mac, row in rows.items() if mac not in existing])
+        
+        ids = {}
+        for i in range(0, len(macs), SQL_BATCH_SIZE):
+            batch = macs[i:i + SQL_BATCH_SIZE]
+            placeholders = ','.join(['?' for _ in batch])
+            ids.update((row['mac_address'], row['id']) for row in conn.execute(
+                f'SELECT id, mac_address FROM devices WHERE mac_address IN ({placeholders})', batch
+            ))
+        
+        conn.commit()
+    finally:
+        conn.close()
+    
+    results = [{
+        'mac_address': mac,
+        'id': ids[mac],
+        'action': 'updated' if mac in existing else 'inserted'
+    } for mac in macs]
+    
+    notify_devices_changed([result['id'] for result in results])
+    return results
+
+def update_device_hostname(mac_address, hostname):
+    """Fill in a hostname that was resolved after the device was saved"""
+    conn = get_db_connection()
+    conn.execute(
+        'UPDATE devices SET hostname = ? WHERE mac_address = ?',
+        (hostname, mac_address)
+    )
+    conn.commit()
+    device = conn.execute('SELECT id FROM devices WHERE mac_address = ?', (mac_address,)).fetchone()
+    conn.close()
+    
+    if device:
+        notify_devices_changed([device['id']])
+
+def get_cached_hostnames(devices, ttl, negative_ttl):
+    """Get fresh cached hostnames for scanner device dicts
+    
+    Returns {mac: hostname} for cache hits; hostname is None for a cached
+    negative result. Entries are stale after ttl seconds (negative_ttl for
+    negative results) or when the MAC has moved to a different IP.
+    """
+    current_ips = {device['mac']: device['ip'] for device in devices if device.get('mac')}
+    if not current_ips:
+        return {}
+    
+    macs = list(current_ips)
+    now = time.time()
+    hits = {}
+    conn = get_db_connection()
+    
+    for i in range(0, len(macs), SQL_BATCH_SIZE):
+        batch = macs[i:i + SQL_BATCH_SIZE]
+        placeholders = ','.join(['?' for _ in batch])
+        rows = conn.execute(f'''
+            SELECT mac_address, ip_address, hostname, resolved_at
+            FROM hostname_cache WHERE mac_address IN ({placeholders})
+        ''', batch).fetchall()
+        
+        for row in rows:
+            max_age = ttl if row['hostname'] else negative_ttl
+            if row['ip_address'] == current_ips[row['mac_address']] and now - row['resolved_at'] < max_age:
+                hits[row['mac_address']] = row['hostname']
+    
+    conn.close()
+    return hits
+
+def cache_hostnames(results):
+    """Store hostname lookup results as (mac, ip, hostname) tuples; hostname may be None"""
+    if not results:
+        return
     
+    now = int(time.time())
+    conn = get_db_connection()
+    conn.executemany('''
+        INSERT INTO hostname_cache (mac_address, ip_address, hostname, resolved_at)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(mac_address) DO UPDATE SET
+            ip_address = excluded.ip_address,
+            hostname = excluded.hostname,
+            resolved_at = excluded.resolved_at
+    ''', [(mac, ip, hostname, now) for mac, ip, hostname in results])
     conn.commit()
     conn.close()
-    return device_id
 
 def get_new_devices():
     """Get devices discovered in the last scan that aren't in inventory"""
@@ -174,12 +858,25 @@ def get_new_devices():
         LEFT JOIN inventory i ON d.id = i.device_id
         WHERE i.device_id IS NULL 
         AND d.is_ignored = 0
-        AND datetime(d.first_seen) > datetime('now', '-1 hour')
-        ORDER BY d.first_seen DESC
-    ''').fetchall()
+        AND d.first_seen_ts > ?
+        ORDER BY d.first_seen_ts DESC
+    ''', (epoch_ago(3600),)).fetchall()
     conn.close()
     return [dict(device) for device in devices]
 
+def get_devices_by_ids(device_ids):
+    """Get the stored rows for a list of device ids, in that order"""
+    conn = get_db_connection()
+    rows = {}
+    for i in range(0, len(device_ids), SQL_BATCH_SIZE):
+        batch = device_ids[i:i + SQL_BATCH_SIZE]
+        placeholders = ','.join(['?' for _ in batch])
+        rows.update((row['id'], dict(row)) for row in conn.execute(
+            f'SELECT * FROM devices WHERE id IN ({placeholders})', batch
+        ))
+    conn.close()
+    return [rows[device_id] for device_id in device_ids if device_id in rows]
+
 def get_categories():
     """Get all categories ordered by default first, then alphabetically"""
     conn = get_db_connection()
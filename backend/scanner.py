@@ -1,109 +1,236 @@
 import scapy.all as scapy
-import nmap
+import ipaddress
+import os
+import queue
 import socket
 import subprocess
 import re
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from backend.database import add_device, get_db_connection
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from backend.database import (
+    add_devices, get_db_connection, update_device_hostname, get_cached_hostnames, cache_hostnames,
+    notify_devices_changed
+)
+from backend.vendor_index import VendorIndex, FALLBACK_VENDORS
 from config import Config
 import threading
 import time
 
+# IEEE MA-L (24-bit), MA-M (28-bit) and MA-S (36-bit) registries
+OUI_URLS = [
+    'https://standards-oui.ieee.org/oui/oui.txt',
+    'https://standards-oui.ieee.org/oui28/mam.txt',
+    'https://standards-oui.ieee.org/oui36/oui36.txt',
+]
+OUI_SOURCES = ['data/oui.txt', 'data/mam.txt', 'data/oui36.txt']
+OUI_INDEX_PATH = 'data/oui.idx'
+OUI_CHECKED_PATH = 'data/oui.checked'  # touched after each successful refresh check
+OUI_MAX_AGE = 30 * 24 * 3600
+
+class ScanCancelToken:
+    """Cancellation flag shared by every stage of one scan
+    
+    cancel() kills any nmap child registered with the token and cancels
+    hostname lookups that have not started yet. The scan loops check
+    cancelled between hosts and stop, keeping whatever was already found.
+    """
+    
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._processes = set()
+        self._futures = set()
+        self.requested_at = None
+    
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+    
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.requested_at = time.monotonic()
+            self._event.set()
+            processes = list(self._processes)
+            futures = list(self._futures)
+        
+        for process in processes:
+            self._kill(process)
+        for future in futures:
+            future.cancel()
+    
+    def elapsed(self):
+        """Seconds since cancel() was called, or None if it was not"""
+        if self.requested_at is None:
+            return None
+        return time.monotonic() - self.requested_at
+    
+    def track_process(self, process):
+        with self._lock:
+            if not self._event.is_set():
+                self._processes.add(process)
+                return
+        self._kill(process)
+    
+    def untrack_process(self, process):
+        with self._lock:
+            self._processes.discard(process)
+    
+    def track_future(self, future):
+        with self._lock:
+            if not self._event.is_set():
+                self._futures.add(future)
+                # Finished lookups have nothing left to cancel
+                future.add_done_callback(self._futures.discard)
+                return
+        future.cancel()
+    
+    def _kill(self, process):
+        try:
+            if process.poll() is None:
+                process.kill()
+        except OSError:
+            pass
+
 class NetworkScanner:
     def __init__(self):
-        self.nm = nmap.PortScanner()
-        self.vendor_db = self._load_vendor_db()
+        # Start on the built-in vendor table; the full IEEE index is loaded and
+        # swapped in by a background thread so startup never waits on it
+        self.vendor_db = VendorIndex.from_entries(FALLBACK_VENDORS)
+        self.vendor_db_ready = threading.Event()
+        
+        # Hostname lookups run on a shared pool; lookups still running when a
+        # device is found are tracked by MAC until flush_pending_hostnames() saves them
+        self.hostname_pool = ThreadPoolExecutor(
+            max_workers=Config.HOSTNAME_WORKERS,
+            thread_name_prefix='hostname'
+        )
+        self.pending_hostnames = {}
+        self.scan_hostnames = []  # (mac, ip, hostname) named by the scan itself, cached on flush
+        self.pending_lock = threading.Lock()
+        
+        # IP -> MAC index of the host neighbor (ARP) table, re-read on misses
+        self.neighbor_index = {}
+        self.neighbor_read_at = 0
+        
+        self.start_vendor_db_refresh()
         
     def _load_vendor_db(self):
         """Load MAC vendor database from IEEE OUI"""
+        self._refresh_oui_sources()
+        vendor_db = VendorIndex.open_compiled(OUI_SOURCES, OUI_INDEX_PATH)
+        print(f"Loaded {len(vendor_db)} vendor entries from IEEE OUI database")
+        return vendor_db
+    
+    def _oui_age(self):
+        """Seconds since the IEEE registry was last checked (None if never)"""
+        for marker in (OUI_CHECKED_PATH, OUI_SOURCES[0]):
+            if os.path.exists(marker):
+                return time.time() - os.path.getmtime(marker)
+        return None
+    
+    def _refresh_oui_sources(self):
+        """Re-check the IEEE registry files if they are missing or over 30 days old
+        
+        Uses conditional requests, so unchanged files are not downloaded again.
+        """
         import requests
-        import os
-        from pathlib import Path
         
-        vendor_db = {}
-        oui_file = Path('data/oui.txt')
-        content = ""
+        oui_file = Path(OUI_SOURCES[0])
+        age = self._oui_age()
+        if oui_file.exists() and age is not None and age < OUI_MAX_AGE:
+            print("Using cached OUI database...")
+            return
         
-        try:
-            # Check if we have a cached OUI file less than 30 days old
-            if oui_file.exists() and (time.time() - oui_file.stat().st_mtime) < (30 * 24 * 3600):
-                print("Loading cached OUI database...")
-                with open(oui_file, 'r', encoding='utf-8', errors='ignore') as f:
-                    content = f.read()
-            else:
-                print("Downloading IEEE OUI database...")
-                # Download the latest OUI database
-                headers = {
-                    'User-Agent': 'Mozilla/5.0 (Linux; x86_64) AppleWebKit/537.36 Network Inventory Manager',
-                    'Accept': 'text/plain',
-                }
-                response = requests.get(
-                    'https://standards-oui.ieee.org/oui/oui.txt',
-                    headers=headers,
-                    timeout=30
-                )
+        print("Checking IEEE OUI database for updates...")
+        headers = {
+            'User-Agent': 'Mozilla/5.0 (Linux; x86_64) AppleWebKit/537.36 Network Inventory Manager',
+            'Accept': 'text/plain',
+        }
+        os.makedirs('data', exist_ok=True)
+        
+        for url, source in zip(OUI_URLS, OUI_SOURCES):
+            request_headers = dict(headers)
+            if os.path.exists(source):
+                request_headers['If-Modified-Since'] = formatdate(os.path.getmtime(source), usegmt=True)
+            
+            try:
+                response = requests.get(url, headers=request_headers, timeout=30)
+                if response.status_code == 304:
+                    continue
                 response.raise_for_status()
-                content = response.text
                 
-                # Cache the downloaded file
-                os.makedirs('data', exist_ok=True)
-                with open(oui_file, 'w', encoding='utf-8') as f:
-                    f.write(content)
-                print("OUI database downloaded and cached")
-            
-            # Parse the OUI file
-            for line in content.splitlines():
-                if '(hex)' in line:
-                    parts = line.split('\t')
-                    if len(parts) >= 3:
-                        oui_hex = parts[0].strip().replace('-', ':').lower()
-                        oui_hex = oui_hex.replace('(hex)', '').strip()
-                        company = parts[2].strip()
-                        if company:
-                            vendor_db[oui_hex] = company
-            
-            print(f"Loaded {len(vendor_db)} vendor entries from IEEE OUI database")
-                    
-        except Exception as e:
-            print(f"Error loading IEEE OUI database: {e}")
-            print("Falling back to basic vendor database...")
-            # Fallback to basic database if download fails
-            vendor_db = {
-                '00:50:56': 'VMware',
-                '08:00:27': 'VirtualBox', 
-                '52:54:00': 'QEMU',
-                'b8:27:eb': 'Raspberry Pi Foundation',
-                'dc:a6:32': 'Raspberry Pi Foundation',
-                'e4:5f:01': 'Raspberry Pi Foundation',
-                '00:16:3e': 'Xen',
-                '00:1b:21': 'Intel Corporate',
-                '00:1e:58': 'WistronInfocomm',
-                '00:26:b9': 'Seagate Technology',
-                '28:c6:8e': 'Ubiquiti Networks',
-                '00:0c:29': 'VMware',
-                '00:15:5d': 'Microsoft Corporation',
-                '00:1c:42': 'Parallels',
-                '00:03:ff': 'Microsoft Corporation',
-                '00:50:f2': 'Microsoft Corporation',
-                '00:17:fa': 'Honeywell',
-                '70:b3:d5': 'IEEE Registration Authority',
-                'ac:de:48': 'Private',
-                '02:00:00': 'Locally Administered',
-                '98:25:4a': 'TP-Link Systems Inc',
-                '84:1b:77': 'Intel Corporate',
-                'bc:33:29': 'Sony Interactive Entertainment Inc.',
-                'bc:51:fe': 'Swann communications Pty Ltd'
-            }
+                with open(source, 'w', encoding='utf-8') as f:
+                    f.write(response.text)
+                
+                # Stamp the file with the server's date for the next If-Modified-Since
+                if response.headers.get('Last-Modified'):
+                    modified = parsedate_to_datetime(response.headers['Last-Modified']).timestamp()
+                    os.utime(source, (modified, modified))
+                print(f"Downloaded {url}")
+            except Exception:
+                # MA-L is required (unless a stale copy exists); MA-M/MA-S only refine it
+                if source == OUI_SOURCES[0] and not oui_file.exists():
+                    raise
+                print(f"Could not download {url}, continuing with cached data")
         
-        return vendor_db
+        Path(OUI_CHECKED_PATH).touch()
     
-    def detect_wsl2(self):
-        """Detect if running in WSL2 environment"""
-        try:
-            with open('/proc/version', 'r') as f:
-                return 'microsoft' in f.read().lower()
-        except:
-            return False
+    def start_vendor_db_refresh(self):
+        """Load the full vendor index in the background and refresh it every 30 days"""
+        def refresh_loop():
+            while True:
+                try:
+                    # Plain attribute assignment, so lookups see either index in full
+                    self.vendor_db = self._load_vendor_db()
+                    self.vendor_db_ready.set()
+                except Exception as e:
+                    print(f"Error loading IEEE OUI database: {e}")
+                    print("Using basic vendor database until the next attempt...")
+                
+                if self.vendor_db_ready.is_set():
+                    try:
+                        self.backfill_vendors()
+                    except Exception as e:
+                        print(f"Error backfilling device vendors: {e}")
+                
+                age = self._oui_age()
+                if self.vendor_db_ready.is_set() and age is not None:
+                    time.sleep(max(60, OUI_MAX_AGE - age))
+                else:
+                    time.sleep(3600)  # Retry a failed first load hourly
+        
+        refresh_thread = threading.Thread(target=refresh_loop, daemon=True)
+        refresh_thread.start()
+        return refresh_thread
+    
+    def backfill_vendors(self):
+        """Fill in vendors for devices stored as 'Unknown' (e.g. while the full index was loading)"""
+        conn = get_db_connection()
+        devices = conn.execute('''
+            SELECT id, mac_address FROM devices 
+            WHERE vendor IS NULL OR vendor = 'Unknown'
+        ''').fetchall()
+        
+        updates = []
+        for device in devices:
+            vendor = self.vendor_db.lookup(device['mac_address'])
+            if vendor:
+                updates.append((vendor, device['id']))
+        
+        if updates:
+            conn.executemany('UPDATE devices SET vendor = ? WHERE id = ?', updates)
+            conn.commit()
+            print(f"Backfilled vendor for {len(updates)} devices")
+        
+        conn.close()
+        if updates:
+            notify_devices_changed([device_id for _, device_id in updates])
+        return len(updates)
     
     def get_network_ranges(self):
         """Get list of network ranges to scan (supports auto-detection and multiple ranges)"""
@@ -138,147 +265,328 @@ class NetworkScanner:
             print(f"Single network range: {config_ranges}")
             return [config_ranges]
     
+    def get_scan_method(self, network_range):
+        """Get the scan engine for a range ('nmap' or 'arp')"""
+        overrides = {}
+        for entry in Config.SCAN_METHOD_OVERRIDES.split(','):
+            if '=' in entry:
+                override_range, method = entry.split('=', 1)
+                overrides[override_range.strip()] = method.strip().lower()
+        
+        return overrides.get(network_range.strip(), Config.SCAN_METHOD.lower())
+    
+    def iter_range(self, network_range, cancel=None):
+        """Yield devices from one range as they are discovered
+        
+        Each live host goes through MAC, vendor and hostname resolution as soon
+        as the scan reports it, so nothing waits for the whole range. Hostnames
+        come from the scan or the hostname cache; other lookups are started in
+        the background and saved later by flush_pending_hostnames(). Stops
+        early once the cancel token is cancelled.
+        """
+        if cancel and cancel.cancelled:
+            return
+        
+        hosts = None
+        if self.get_scan_method(network_range) == 'arp':
+            iface = self.get_local_interface(network_range)
+            if iface is None:
+                print(f"{network_range} is not directly attached - using nmap instead of ARP")
+            else:
+                try:
+                    hosts = [(ip, mac, None) for ip, mac in self._arp_sweep(network_range, iface)]
+                    reverse_dns_done = False
+                except Exception as e:
+                    print(f"ARP scan failed ({e}) - using nmap instead")
+        
+        if hosts is None:
+            hosts = self._nmap_hosts(network_range, cancel=cancel)
+            reverse_dns_done = True
+        
+        # Hosts missing from the neighbor table are retried once the sweep ends
+        deferred = []
+        for ip, mac, hostname in hosts:
+            if cancel and cancel.cancelled:
+                return
+            mac = mac or self._lookup_neighbor(ip)
+            if mac:
+                yield self._finish_device(ip, mac, hostname, reverse_dns_done, cancel)
+            else:
+                deferred.append((ip, hostname))
+        
+        if deferred and not (cancel and cancel.cancelled):
+            self.neighbor_index = self.read_neighbor_table()
+            self.neighbor_read_at = time.monotonic()
+            for ip, hostname in deferred:
+                if self.neighbor_index.get(ip):
+                    yield self._finish_device(ip, self.neighbor_index[ip], hostname, reverse_dns_done, cancel)
+    
+    def scan_batches(self, network_ranges, on_range_complete=None, max_batch=50, max_wait=0.5, cancel=None):
+        """Scan ranges concurrently, yielding newly discovered devices in small batches
+        
+        Up to Config.SCAN_CONCURRENCY ranges run iter_range() at once. Devices
+        are deduplicated by MAC and yielded once max_batch have arrived or
+        max_wait seconds after the first one, so callers can save and report
+        them while the scan is still running. If given,
+        on_range_complete(network_range, found, completed, total) is called as
+        each range finishes, after that range's devices have been yielded.
+        
+        When the cancel token is cancelled, the devices already received are
+        yielded as a final batch and the generator returns without waiting
+        for the remaining ranges. Ranges cut short by the cancellation are
+        not reported to on_range_complete.
+        """
+        events = queue.Queue()
+        total = len(network_ranges)
+        
+        def scan_worker(network_range):
+            found = 0
+            try:
+                for device in self.iter_range(network_range, cancel):
+                    device['range'] = network_range
+                    events.put(('device', network_range, device))
+                    found += 1
+            except Exception as e:
+                print(f"Error scanning {network_range}: {e}")
+            finally:
+                events.put(('done', network_range, found))
+        
+        workers = max(1, min(Config.SCAN_CONCURRENCY, total))
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='scan')
+        seen_macs = set()
+        completed = 0
+        batch = []
+        batch_deadline = None
+        
+        try:
+            for network_range in network_ranges:
+                pool.submit(scan_worker, network_range)
+            
+            while completed < total:
+                if cancel and cancel.cancelled:
+                    break
+                
+                # Wake up regularly so a cancellation is noticed between events
+                timeout = 0.2 if batch_deadline is None else min(0.2, max(0, batch_deadline - time.monotonic()))
+                try:
+                    kind, network_range, payload = events.get(timeout=timeout)
+                except queue.Empty:
+                    if batch_deadline is not None and time.monotonic() >= batch_deadline:
+                        yield batch
+                        batch, batch_deadline = [], None
+                    continue
+                
+                if kind == 'device':
+                    if payload['mac'] in seen_macs:
+                        continue
+                    seen_macs.add(payload['mac'])
+                    batch.append(payload)
+                    if batch_deadline is None:
+                        batch_deadline = time.monotonic() + max_wait
+                    if len(batch) >= max_batch:
+                        yield batch
+                        batch, batch_deadline = [], None
+                else:
+                    if cancel and cancel.cancelled:
+                        break  # The range was cut short, not finished
+                    completed += 1
+                    if batch:
+                        yield batch
+                        batch, batch_deadline = [], None
+                    if on_range_complete:
+                        on_range_complete(network_range, payload, completed, total)
+            
+            if batch:
+                yield batch
+        finally:
+            pool.shutdown(wait=False)
+    
     def get_vendor_from_mac(self, mac_address):
         """Get vendor from MAC address"""
         if not mac_address:
             return None
             
-        # Get first 3 octets
-        mac_prefix = ':'.join(mac_address.split(':')[:3]).lower()
-        return self.vendor_db.get(mac_prefix, 'Unknown')
+        # Longest matching MA-S/MA-M/MA-L assignment
+        return self.vendor_db.lookup(mac_address) or 'Unknown'
     
-    def get_mac_for_ip(self, ip):
-        """Try to get MAC address for IP"""
-        # Try ping then check ARP table
-        try:
-            subprocess.run(['ping', '-c', '1', '-W', '1', ip], 
-                          capture_output=True, timeout=3)
-            result = subprocess.run(['arp', '-n'], capture_output=True, text=True)
-            for line in result.stdout.splitlines():
-                if ip in line:
-                    parts = line.split()
-                    if len(parts) >= 3:
-                        mac = parts[2] if len(parts[2]) == 17 else parts[1]
-                        if ':' in mac and len(mac) == 17:
-                            return mac
-        except:
-            pass
-        
+    def _short_hostname(self, hostname, ip_address):
+        """Reduce a DNS name to its host part, ignoring names that are just the IP"""
+        if hostname and not hostname.startswith(ip_address):
+            return hostname.split('.')[0]
         return None
     
-    def wsl2_ping_scan(self, network_range):
-        """Use nmap for WSL2 since ARP table is isolated"""
+    def _nmap_hosts(self, network_range, arguments='-sn --host-timeout 2s', cancel=None):
+        """Run an nmap sweep and yield (ip, mac, hostname) for each live host as nmap reports it
+        
+        nmap's XML output is parsed as it is written, so hosts arrive while the
+        sweep is still running. mac and hostname are None when nmap has none.
+        Cancelling the token kills nmap, which ends the output early.
+        """
+        process = subprocess.Popen(
+            ['nmap', *arguments.split(), '-oX', '-', network_range.strip()],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        if cancel:
+            cancel.track_process(process)
+        parser = ET.XMLPullParser(events=('end',))
+        
         try:
-            print(f"WSL2 detected - using nmap scan for {network_range}")
-            self.nm.scan(hosts=network_range, arguments='-sn --host-timeout 2s')
-            
-            devices = []
-            for host in self.nm.all_hosts():
-                if self.nm[host].state() == 'up':
-                    device = {
-                        'ip': host,
-                        'mac': self.get_mac_for_ip(host),
-                        'hostname': self.get_hostname(host),
-                        'vendor': None
-                    }
-                    if device['mac']:
-                        device['vendor'] = self.get_vendor_from_mac(device['mac'])
-                        devices.append(device)
-                        
-            return devices
-            
-        except Exception as e:
-            print(f"WSL2 scan failed: {e}")
-            return []
+            for line in process.stdout:
+                parser.feed(line)
+                for _, elem in parser.read_events():
+                    if elem.tag != 'host':
+                        continue
+                    
+                    status = elem.find('status')
+                    if status is not None and status.get('state') == 'up':
+                        addresses = {addr.get('addrtype'): addr.get('addr') for addr in elem.findall('address')}
+                        name = elem.find('hostnames/hostname')
+                        ip = addresses.get('ipv4')
+                        if ip:
+                            yield (
+                                ip,
+                                self._clean_mac(addresses.get('mac')),
+                                self._short_hostname(name.get('name') if name is not None else None, ip)
+                            )
+                    elem.clear()
+            process.wait()
+        except ET.ParseError:
+            # Output cut short by a cancellation
+            if not (cancel and cancel.cancelled):
+                raise
+        finally:
+            if cancel:
+                cancel.untrack_process(process)
+            if process.poll() is None:
+                process.kill()
+                process.wait()
     
-    def ping_scan(self, network_range=None):
-        """Perform ping scan using host system's network stack"""
-        if network_range is None:
-            network_range = self.get_network_range()
-            
-        print(f"Scanning network range: {network_range}")
+    def _lookup_neighbor(self, ip):
+        """Look up one IP in the neighbor index, re-reading it at most once a second on misses"""
+        if ip not in self.neighbor_index and time.monotonic() - self.neighbor_read_at > 1:
+            self.neighbor_index = self.read_neighbor_table()
+            self.neighbor_read_at = time.monotonic()
+        return self.neighbor_index.get(ip)
+    
+    def _finish_device(self, ip, mac, hostname, reverse_dns_done, cancel=None):
+        """Build the device dict for one discovered host
+        
+        Uses the name from the scan or the hostname cache when there is one;
+        otherwise starts a lookup and leaves the hostname pending.
+        """
+        device = {
+            'ip': ip,
+            'mac': mac,
+            'hostname': hostname,
+            'vendor': self.get_vendor_from_mac(mac)
+        }
+        
+        if hostname:
+            with self.pending_lock:
+                self.scan_hostnames.append((mac, ip, hostname))
+            return device
         
         try:
-            # Use nmap first to populate ARP table, then read host ARP
-            print("Using nmap + host ARP method for Ubuntu...")
-            
-            # Step 1: Use nmap to discover live hosts
-            self.nm.scan(hosts=network_range, arguments='-sn --host-timeout 2s')
-            
-            # Step 2: Read ARP table from host system (works even in container)
-            devices = []
-            live_ips = [host for host in self.nm.all_hosts() if self.nm[host].state() == 'up']
-            
-            for ip in live_ips:
-                # Try to get MAC from multiple sources
-                mac = self.get_mac_from_proc(ip) or self.get_mac_for_ip(ip)
-                
-                if mac:
-                    device = {
-                        'ip': ip,
-                        'mac': mac,
-                        'hostname': self.get_hostname(ip),
-                        'vendor': self.get_vendor_from_mac(mac)
-                    }
-                    devices.append(device)
-                    
-            return devices
-            
+            cached = get_cached_hostnames([device], Config.HOSTNAME_CACHE_TTL, Config.HOSTNAME_NEGATIVE_TTL)
         except Exception as e:
-            print(f"Error during scan: {e}")
-            return []
-
-    def get_mac_from_proc(self, ip):
-        """Try to get MAC from /proc/net/arp (often works in containers)"""
+            print(f"Error reading hostname cache: {e}")
+            cached = {}
+        
+        if mac in cached:
+            device['hostname'] = cached[mac]
+        elif not (cancel and cancel.cancelled):
+            future = self.hostname_pool.submit(self.get_hostname, ip, not reverse_dns_done)
+            if cancel:
+                cancel.track_future(future)
+            with self.pending_lock:
+                self.pending_hostnames[mac] = (ip, future)
+        
+        return device
+    
+    def get_local_interface(self, network_range):
+        """Get the interface a range is directly attached to, or None if it is routed"""
+        try:
+            network = ipaddress.ip_network(network_range.strip(), strict=False)
+            probe = next(network.hosts(), network.network_address)
+            iface, _, gateway = scapy.conf.route.route(str(probe))
+            if gateway == '0.0.0.0':
+                return iface
+        except Exception as e:
+            print(f"Could not find route for {network_range}: {e}")
+        return None
+    
+    def _arp_sweep(self, network_range, iface, timeout=None):
+        """Send one ARP request burst to a local range and return the (ip, mac) replies"""
+        if timeout is None:
+            timeout = Config.ARP_SCAN_TIMEOUT
+        
+        print(f"ARP sweep of {network_range} on {iface} (timeout {timeout}s)")
+        request = scapy.Ether(dst='ff:ff:ff:ff:ff:ff') / scapy.ARP(pdst=network_range.strip())
+        answered, _ = scapy.srp(request, iface=iface, timeout=timeout, verbose=False)
+        
+        hosts = {}
+        for _, reply in answered:
+            mac = self._clean_mac(reply[scapy.ARP].hwsrc)
+            if mac:
+                hosts.setdefault(reply[scapy.ARP].psrc, mac)
+        
+        self.neighbor_index.update(hosts)
+        return list(hosts.items())
+    
+    def _clean_mac(self, mac):
+        """Normalise a MAC address, returning None for empty or incomplete entries"""
+        if not mac:
+            return None
+        mac = mac.lower()
+        if len(mac) != 17 or ':' not in mac or mac == '00:00:00:00:00:00':
+            return None
+        return mac
+    
+    def read_neighbor_table(self):
+        """Read the whole host ARP/neighbor table into an IP -> MAC index"""
+        neighbors = {}
         try:
             with open('/proc/net/arp', 'r') as f:
                 for line in f:
                     parts = line.split()
-                    if len(parts) >= 4 and parts[0] == ip:
-                        mac = parts[3]
-                        if mac != "00:00:00:00:00:00" and ":" in mac:
-                            return mac.lower()
-        except:
+                    if len(parts) >= 4:
+                        mac = self._clean_mac(parts[3])
+                        if mac:
+                            neighbors[parts[0]] = mac
+        except OSError:
             pass
-        return None
-    
-    def fallback_scan(self, network_range):
-        """Fallback scan using nmap if scapy fails"""
+        
+        if neighbors:
+            return neighbors
+        
+        # /proc not readable here - ask iproute2 once instead
         try:
-            print("Using nmap fallback scan...")
-            self.nm.scan(hosts=network_range, arguments='-sn')
-            
-            devices = []
-            for host in self.nm.all_hosts():
-                if self.nm[host].state() == 'up':
-                    # Try to get MAC address
-                    mac = None
-                    if 'mac' in self.nm[host]['addresses']:
-                        mac = self.nm[host]['addresses']['mac']
-                    
-                    device = {
-                        'ip': host,
-                        'mac': mac,
-                        'hostname': self.get_hostname(host),
-                        'vendor': self.get_vendor_from_mac(mac) if mac else None
-                    }
-                    devices.append(device)
-                    
-            return devices
-            
-        except Exception as e:
-            print(f"Fallback scan failed: {e}")
-            return []
+            result = subprocess.run(['ip', 'neigh', 'show'], 
+                                capture_output=True, text=True, timeout=3)
+            for line in result.stdout.splitlines():
+                parts = line.split()
+                if 'lladdr' in parts[:-1]:
+                    mac = self._clean_mac(parts[parts.index('lladdr') + 1])
+                    if mac:
+                        neighbors[parts[0]] = mac
+        except Exception:
+            pass
+        
+        return neighbors
     
-    def get_hostname(self, ip_address):
-        """Get hostname from IP address using multiple methods"""
+    def get_hostname(self, ip_address, reverse_dns=True):
+        """Get hostname from IP address using multiple methods
+        
+        Pass reverse_dns=False when nmap already tried a PTR lookup for the IP.
+        """
         # Method 1: Standard reverse DNS lookup
-        try:
-            hostname = socket.gethostbyaddr(ip_address)[0]
-            if hostname and not hostname.startswith(ip_address):
-                return hostname.split('.')[0]  # Return just the host part
-        except (socket.herror, socket.gaierror):
-            pass
+        if reverse_dns:
+            try:
+                hostname = socket.gethostbyaddr(ip_address)[0]
+                if hostname and not hostname.startswith(ip_address):
+                    return hostname.split('.')[0]  # Return just the host part
+            except (socket.herror, socket.gaierror):
+                pass
         
         # Method 2: Try nslookup command
         try:
@@ -305,38 +613,67 @@ class NetworkScanner:
         
         return None
     
+    def flush_pending_hostnames(self):
+        """Save late hostname lookups to the database as they complete
+        
+        Call this after the scan results have been saved so every pending MAC
+        already has a row to update.
+        """
+        with self.pending_lock:
+            pending = self.pending_hostnames
+            self.pending_hostnames = {}
+            scan_hostnames = self.scan_hostnames
+            self.scan_hostnames = []
+        
+        if scan_hostnames:
+            try:
+                cache_hostnames(scan_hostnames)
+            except Exception as e:
+                print(f"Error writing hostname cache: {e}")
+        
+        if not pending:
+            return None
+        
+        def save_when_ready():
+            lookups = {future: (mac, ip) for mac, (ip, future) in pending.items()}
+            resolved = 0
+            for future in as_completed(lookups):
+                mac, ip = lookups[future]
+                if future.cancelled():
+                    continue
+                try:
+                    hostname = future.result()
+                except Exception:
+                    continue
+                if hostname:
+                    update_device_hostname(mac, hostname)
+                    resolved += 1
+                cache_hostnames([(mac, ip, hostname)])
+            print(f"Filled in {resolved} of {len(pending)} pending hostnames")
+        
+        flush_thread = threading.Thread(target=save_when_ready, daemon=True)
+        flush_thread.start()
+        return flush_thread
+    
     def scan_network(self):
-        """Main network scanning function with multi-range support"""
+        """Main network scanning function with multi-range support
+        
+        Devices are saved batch by batch and not kept afterwards; returns how
+        many were found.
+        """
         print(f"Starting network scan at {datetime.now()}")
         
         network_ranges = self.get_network_ranges()
-        all_devices = []
+        found = 0
         
-        for network_range in network_ranges:
-            print(f"Scanning range: {network_range}")
-            
-            if self.detect_wsl2():
-                devices = self.wsl2_ping_scan(network_range)
-            else:
-                devices = self.ping_scan(network_range)
-            
-            all_devices.extend(devices)
-        
-        # Process all discovered devices
-        processed_devices = []
-        for device in all_devices:
-            if device['mac']:
-                device_id = add_device(
-                    mac_address=device['mac'],
-                    ip_address=device['ip'],
-                    hostname=device['hostname'],
-                    vendor=device['vendor']
-                )
-                device['id'] = device_id
-                processed_devices.append(device)
-    
-        print(f"Scan completed. Found {len(processed_devices)} devices across {len(network_ranges)} networks")
-        return processed_devices
+        # Save devices batch by batch while the scan is still running
+        for batch in self.scan_batches(network_ranges):
+            found += len(add_devices(batch))
+        
+        self.flush_pending_hostnames()
+    
+        print(f"Scan completed. Found {found} devices across {len(network_ranges)} networks")
+        return found
     
     def start_periodic_scan(self, interval=None):
         """Start periodic network scanning"""
@@ -363,6 +700,7 @@ def mark_device_ignored(device_id):
     conn.execute('UPDATE devices SET is_ignored = 1 WHERE id = ?', (device_id,))
     conn.commit()
     conn.close()
+    notify_devices_changed([device_id])
 
 def add_to_inventory(device_id, name, category=None, **kwargs):
     """Add device to managed inventory"""
@@ -0,0 +1,193 @@
+import mmap
+import os
+import struct
+import zlib
+from pathlib import Path
+
+# Compiled index layout (little endian):
+#   header  - magic, source signature, entry counts for 24/28/36-bit prefixes
+#   tables  - one sorted (prefix, name offset) table per prefix length
+#   names   - deduplicated vendor names, each terminated by a newline
+INDEX_MAGIC = b'HTOUI\x00\x01\x00'
+HEADER = struct.Struct('<8sQIII')
+ENTRY = struct.Struct('<QI')
+PREFIX_LENGTHS = (36, 28, 24)  # longest first
+
+# Built-in table used until the full IEEE registry is available
+FALLBACK_VENDORS = {
+    '00:50:56': 'VMware',
+    '08:00:27': 'VirtualBox',
+    '52:54:00': 'QEMU',
+    'b8:27:eb': 'Raspberry Pi Foundation',
+    'dc:a6:32': 'Raspberry Pi Foundation',
+    'e4:5f:01': 'Raspberry Pi Foundation',
+    '00:16:3e': 'Xen',
+    '00:1b:21': 'Intel Corporate',
+    '00:1e:58': 'WistronInfocomm',
+    '00:26:b9': 'Seagate Technology',
+    '28:c6:8e': 'Ubiquiti Networks',
+    '00:0c:29': 'VMware',
+    '00:15:5d': 'Microsoft Corporation',
+    '00:1c:42': 'Parallels',
+    '00:03:ff': 'Microsoft Corporation',
+    '00:50:f2': 'Microsoft Corporation',
+    '00:17:fa': 'Honeywell',
+    '70:b3:d5': 'IEEE Registration Authority',
+    'ac:de:48': 'Private',
+    '02:00:00': 'Locally Administered',
+    '98:25:4a': 'TP-Link Systems Inc',
+    '84:1b:77': 'Intel Corporate',
+    'bc:33:29': 'Sony Interactive Entertainment Inc.',
+    'bc:51:fe': 'Swann communications Pty Ltd'
+}
+
+def parse_ieee_registry(path):
+    """Yield (prefix_bits, prefix_value, vendor) from an IEEE MA-L/MA-M/MA-S text file
+
+    Each assignment has a '(hex)' line with the 24-bit block and vendor, followed
+    by a '(base 16)' line. In the MA-M and MA-S files that line holds the assigned
+    range (e.g. 000000-0FFFFF), which tells us how many extra bits are fixed.
+    """
+    block = None
+    vendor = None
+
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            if '(hex)' in line:
+                hex_part, _, vendor = line.partition('(hex)')
+                block = hex_part.strip().replace('-', '').upper()
+                vendor = vendor.strip()
+                if len(block) != 6:
+                    block = None
+            elif '(base 16)' in line and block and vendor:
+                assigned = line.partition('(base 16)')[0].strip().upper()
+                fixed = 0
+                if '-' in assigned:
+                    start, _, end = assigned.partition('-')
+                    while fixed < min(len(start), len(end)) and start[fixed] == end[fixed]:
+                        fixed += 1
+                    assigned = start
+                try:
+                    yield 24 + 4 * fixed, int(block + assigned[:fixed], 16), vendor
+                except ValueError:
+                    pass
+                block = None
+
+def source_signature(sources):
+    """Fingerprint the source files so the index is only rebuilt when they change"""
+    parts = []
+    for source in sources:
+        source = Path(source)
+        if source.exists():
+            stat = source.stat()
+            parts.append(f'{source.name}:{stat.st_size}:{stat.st_mtime_ns}')
+    return zlib.crc32('|'.join(parts).encode())
+
+def compile_entries(entries, signature=0):
+    """Compile (prefix_bits, prefix_value, vendor) entries into index bytes"""
+    tables = {bits: {} for bits in PREFIX_LENGTHS}
+    names = {}
+    names_blob = bytearray()
+
+    for bits, value, vendor in entries:
+        if bits not in tables or value in tables[bits]:
+            continue
+        if vendor not in names:
+            names[vendor] = len(names_blob)
+            names_blob += vendor.replace('\n', ' ').encode('utf-8') + b'\n'
+        tables[bits][value] = names[vendor]
+
+    out = bytearray(HEADER.pack(INDEX_MAGIC, signature, *(len(tables[bits]) for bits in PREFIX_LENGTHS)))
+    for bits in PREFIX_LENGTHS:
+        for value in sorted(tables[bits]):
+            out += ENTRY.pack(value, tables[bits][value])
+    out += names_blob
+    return bytes(out)
+
+class VendorIndex:
+    """Longest-prefix MAC vendor lookup over a compiled (usually memory-mapped) index"""
+
+    def __init__(self, buffer):
+        magic, self.signature, *counts = HEADER.unpack_from(buffer, 0)
+        if magic != INDEX_MAGIC:
+            raise ValueError("Not a compiled vendor index")
+
+        self._buffer = buffer
+        self._tables = []
+        offset = HEADER.size
+        for bits, count in zip(PREFIX_LENGTHS, counts):
+            self._tables.append((bits, offset, count))
+            offset += count * ENTRY.size
+        self._names_offset = offset
+        self._count = sum(counts)
+
+    def __len__(self):
+        return self._count
+
+    @classmethod
+    def from_entries(cls, vendors):
+        """Build an in-memory index from a {'aa:bb:cc': vendor} dict"""
+        entries = [(24, int(prefix.replace(':', ''), 16), vendor) for prefix, vendor in vendors.items()]
+        return cls(compile_entries(entries))
+
+    @classmethod
+    def open_compiled(cls, sources, index_path):
+        """Memory-map the compiled index, rebuilding it first if the sources changed"""
+        index_path = Path(index_path)
+        signature = source_signature(sources)
+
+        if index_path.exists():
+            index = cls._map(index_path)
+            if index.signature == signature:
+                return index
+
+        entries = []
+        for source in sources:
+            if Path(source).exists():
+                entries.extend(parse_ieee_registry(source))
+        if not entries:
+            raise FileNotFoundError("No IEEE registry files to compile")
+
+        tmp_path = index_path.with_suffix('.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(compile_entries(entries, signature))
+        os.replace(tmp_path, index_path)
+        print(f"Compiled vendor index with {len(entries)} assignments")
+
+        return cls._map(index_path)
+
+    @classmethod
+    def _map(cls, index_path):
+        with open(index_path, 'rb') as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def lookup(self, mac_address):
+        """Get the vendor for a MAC address, or None if no assignment matches"""
+        digits = mac_address.replace(':', '').replace('-', '').replace('.', '')
+        if len(digits) != 12:
+            return None
+        try:
+            mac_value = int(digits, 16)
+        except ValueError:
+            return None
+
+        for bits, offset, count in self._tables:
+            name_offset = self._search(offset, count, mac_value >> (48 - bits))
+            if name_offset is not None:
+                start = self._names_offset + name_offset
+                end = self._buffer.find(b'\n', start)
+                return self._buffer[start:end].decode('utf-8')
+        return None
+
+    def _search(self, offset, count, key):
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            prefix, name_offset = ENTRY.unpack_from(self._buffer, offset + mid * ENTRY.size)
+            if prefix < key:
+                lo = mid + 1
+            elif prefix > key:
+                hi = mid
+            else:
+                return name_offset
+        return None
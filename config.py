@@ -8,6 +8,12 @@ class Config:
     
     # Database
     DATABASE_PATH = os.getenv('DATABASE_PATH', 'data/inventory.db')
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 8))  # idle connections kept open
+    DB_SYNCHRONOUS = os.getenv('DB_SYNCHRONOUS', 'NORMAL')  # OFF, NORMAL or FULL
+    DB_CACHE_SIZE_KB = int(os.getenv('DB_CACHE_SIZE_KB', 16384))  # page cache per connection
+    DB_MMAP_SIZE = int(os.getenv('DB_MMAP_SIZE', 64 * 1024 * 1024))  # bytes, 0 disables
+    DB_BUSY_TIMEOUT = int(os.getenv('DB_BUSY_TIMEOUT', 5000))  # milliseconds
+    COUNTER_RECONCILE_INTERVAL = int(os.getenv('COUNTER_RECONCILE_INTERVAL', 3600))  # seconds
     
     # Flask
     SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key-change-this')
@@ -17,6 +23,15 @@ class Config:
     # Network scanning
     SCAN_INTERVAL = int(os.getenv('SCAN_INTERVAL', 300))  # 5 minutes
     NETWORK_RANGE = os.getenv('NETWORK_RANGE', '192.168.0.0/24')
+    SCAN_METHOD = os.getenv('SCAN_METHOD', 'nmap')  # 'nmap' or 'arp'
+    SCAN_METHOD_OVERRIDES = os.getenv('SCAN_METHOD_OVERRIDES', '')  # e.g. 192.168.1.0/24=arp
+    ARP_SCAN_TIMEOUT = float(os.getenv('ARP_SCAN_TIMEOUT', 2))  # seconds
+    SCAN_CONCURRENCY = int(os.getenv('SCAN_CONCURRENCY', 4))  # ranges scanned at once
+    
+    # Hostname resolution
+    HOSTNAME_WORKERS = int(os.getenv('HOSTNAME_WORKERS', 32))
+    HOSTNAME_CACHE_TTL = int(os.getenv('HOSTNAME_CACHE_TTL', 86400))  # 24 hours
+    HOSTNAME_NEGATIVE_TTL = int(os.getenv('HOSTNAME_NEGATIVE_TTL', 3600))  # 1 hour for hosts with no name
     
     # Data directory
     DATA_DIR = Path('data')
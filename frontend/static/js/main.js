@@ -12,6 +12,22 @@ let selectedInventoryItems = new Set(); // Track selected inventory item IDs
 // Initialize SocketIO
 const socket = io();
 
+// Socket.IO topics shown by the current page; the server only sends these
+function pageTopics() {
+    const path = window.location.pathname;
+    if (path.includes('scanning')) return ['scan', 'status'];
+    if (path.includes('inventory')) return ['inventory'];
+    if (path.includes('categories')) return [];
+    return ['status', 'scan', 'alerts']; // Dashboard
+}
+
+// This socket only handles scan events (rooms are rejoined on every reconnect)
+socket.on('connect', function() {
+    if (pageTopics().includes('scan')) {
+        socket.emit('subscribe_topics', {topics: ['scan']});
+    }
+});
+
 // Socket event listeners for real-time scan updates
 socket.on('scan_start', function(data) {
     console.log('Scan started:', data.message);
@@ -23,9 +39,9 @@ socket.on('scan_progress', function(data) {
     updateScanProgress(data.message, data);
 });
 
-socket.on('device_discovered', function(data) {
-    console.log('Device discovered:', data.device);
-    addDeviceToTable(data.device);
+socket.on('devices_discovered', function(data) {
+    console.log(`Devices discovered: ${data.devices.length} (batch ${data.batch})`);
+    data.devices.forEach(addDeviceToTable);
     updateDeviceCount(data.total_found);
 });
 
@@ -36,6 +52,13 @@ socket.on('scan_complete', function(data) {
     refreshAllData();
 });
 
+socket.on('scan_cancelled', function(data) {
+    console.log('Scan cancelled:', data.message);
+    hideScanProgress();
+    showNotification(data.message, 'warning');
+    refreshAllData();
+});
+
 socket.on('scan_error', function(data) {
     console.log('Scan error:', data.message);
     hideScanProgress();
@@ -280,7 +303,7 @@ async function loadWarrantyAlerts() {
 async function loadScanningData() {
     try {
         const [devicesResponse, statsResponse] = await Promise.all([
-            fetch('/api/devices'),
+            fetch('/api/devices?limit=1&fields=last_seen'),
             fetch('/api/scanning/stats')
         ]);
         
@@ -300,9 +323,9 @@ async function loadScanningData() {
         const ignoredCount = document.getElementById('ignored-devices-count');
         if (ignoredCount) ignoredCount.textContent = stats.ignored_devices;
 
-        // Update last scan time
+        // Update last scan time (the most recently seen device)
         if (devices.length > 0) {
-            const lastScan = Math.max(...devices.map(d => new Date(d.last_seen)));
+            const lastScan = new Date(devices[0].last_seen);
             const lastScanDisplay = document.getElementById('last-scan-display');
             if (lastScanDisplay) lastScanDisplay.textContent = formatDateTime(lastScan);
         }
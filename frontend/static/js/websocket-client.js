@@ -9,6 +9,12 @@ class HomeTierRealtime {
         this.reconnectDelay = 1000; // Start with 1 second
         this.heartbeatInterval = null;
         
+        // Device status state, kept in step with the server's numbered deltas
+        this.statusSeq = null;
+        this.statusBootId = null; // Which server run statusSeq belongs to
+        this.statusCounts = {online: 0, offline: 0, unknown: 0};
+        this.deviceStatuses = {};
+        
         this.initializeConnection();
         this.setupEventHandlers();
     }
@@ -60,8 +66,12 @@ class HomeTierRealtime {
         });
         
         // Real-time event handlers
-        this.socket.on('device_status_changes', (data) => {
-            this.handleDeviceStatusChanges(data);
+        this.socket.on('device_status_delta', (delta) => {
+            this.handleDeviceStatusDelta(delta);
+        });
+        
+        this.socket.on('device_status_sync', (data) => {
+            this.handleDeviceStatusSync(data);
         });
         
         this.socket.on('device_status_counts', (data) => {
@@ -168,8 +178,19 @@ class HomeTierRealtime {
     }
     
     requestInitialData() {
+        // Rooms do not survive a reconnect, so rejoin this page's topics every time
+        const topics = pageTopics();
+        this.socket.emit('subscribe_topics', {topics: topics});
+        if (topics.includes('status')) {
+            this.requestStatusSync();
+        }
+    }
+    
+    requestStatusSync() {
+        // Ask for the deltas missed since statusSeq, or a full snapshot on first
+        // connect or after the server restarted
         if (this.connected) {
-            this.socket.emit('request_device_status');
+            this.socket.emit('request_status_sync', {since: this.statusSeq, boot_id: this.statusBootId});
         }
     }
     
@@ -189,25 +210,67 @@ class HomeTierRealtime {
     }
     
     // Event Handlers
-    handleDeviceStatusChanges(data) {
-        console.log('Device status changes:', data);
+    handleDeviceStatusDelta(delta) {
+        if (this.statusSeq === null) {
+            return; // Not synced yet
+        }
+        if (delta.boot_id !== this.statusBootId) {
+            this.requestStatusSync(); // Server restarted; sequence numbers start over
+            return;
+        }
+        if (delta.seq <= this.statusSeq) {
+            return; // Already applied
+        }
+        if (delta.seq > this.statusSeq + 1) {
+            this.requestStatusSync(); // Missed a delta
+            return;
+        }
+        this.applyStatusDelta(delta, true);
+    }
+    
+    handleDeviceStatusSync(data) {
+        if (data.snapshot) {
+            this.deviceStatuses = data.snapshot.devices;
+            this.statusCounts = data.snapshot.counts;
+            document.querySelectorAll('tr[data-device-id]').forEach(row => {
+                const status = this.deviceStatuses[row.dataset.deviceId];
+                if (status) this.updateDeviceRowStatus(row.dataset.deviceId, status);
+            });
+            this.updateDeviceStatusCounts(this.statusCounts);
+        } else {
+            data.deltas.forEach(delta => this.applyStatusDelta(delta, false));
+        }
+        this.statusSeq = data.seq;
+        this.statusBootId = data.boot_id;
+    }
+    
+    applyStatusDelta(delta, notify) {
+        if (delta.changes) {
+            this.handleDeviceStatusChanges(delta.changes, notify);
+        }
+        if (delta.counts) {
+            Object.assign(this.statusCounts, delta.counts);
+            this.updateDeviceStatusCounts(this.statusCounts);
+        }
+        this.statusSeq = delta.seq;
+    }
+    
+    handleDeviceStatusChanges(changes, notify) {
+        console.log('Device status changes:', changes);
         
-        data.changes.forEach(change => {
+        changes.forEach(change => {
+            const oldStatus = this.deviceStatuses[change.device_id];
+            this.deviceStatuses[change.device_id] = change.status;
+            
             // Show notification for significant changes
-            if (change.old_status === 'online' && change.new_status === 'offline') {
-                showNotification(
-                    `Device went offline: ${change.device_info.hostname || change.device_info.ip_address}`,
-                    'warning'
-                );
-            } else if (change.old_status === 'offline' && change.new_status === 'online') {
-                showNotification(
-                    `Device came online: ${change.device_info.hostname || change.device_info.ip_address}`,
-                    'success'
-                );
+            if (notify && oldStatus === 'online' && change.status === 'offline') {
+                showNotification(`Device went offline: ${change.name}`, 'warning');
+            } else if (notify && oldStatus === 'offline' && change.status === 'online') {
+                showNotification(`Device came online: ${change.name}`, 'success');
             }
             
             // Update device row in table if visible
-            this.updateDeviceRowStatus(change.device_id, change.new_status);
+            this.updateDeviceRowStatus(change.device_id, change.status);
         });
         
         // Update charts if they exist
@@ -1,7 +1,7 @@
 # routes/categories.py
 
 from flask import Blueprint, request, jsonify
-from backend.database import get_categories, add_category, update_category, delete_category, get_db_connection
+from backend.database import get_categories, add_category, update_category, delete_category, get_db_connection, get_snapshot_connection, epoch_ago, get_counters
 
 categories_bp = Blueprint('categories', __name__)
 
@@ -206,8 +206,8 @@ def get_category_stats(category_id):
             SELECT COUNT(*) as count
             FROM inventory
             WHERE category_id = ? AND deleted_at IS NULL 
-            AND datetime(created_at) > datetime('now', '-30 days')
-        ''', (category_id,)).fetchone()
+            AND created_at_ts > ?
+        ''', (category_id, epoch_ago(30 * 86400))).fetchone()
         
         conn.close()
         
@@ -233,31 +233,21 @@ def get_category_stats(category_id):
 def get_all_categories_stats():
     """Get statistics for all categories"""
     try:
-        conn = get_db_connection()
+        conn = get_snapshot_connection()
         
         # Get stats for all categories including usage counts
         category_stats = conn.execute('''
             SELECT 
                 c.*,
-                COALESCE(item_counts.item_count, 0) as item_count,
-                COALESCE(item_counts.total_value, 0) as total_value
+                COALESCE(cc.item_count, 0) as item_count,
+                COALESCE(cc.total_value, 0) as total_value
             FROM categories c
-            LEFT JOIN (
-                SELECT 
-                    category_id,
-                    COUNT(*) as item_count,
-                    COALESCE(SUM(CAST(price as REAL)), 0) as total_value
-                FROM inventory 
-                WHERE deleted_at IS NULL 
-                GROUP BY category_id
-            ) item_counts ON c.id = item_counts.category_id
-            ORDER BY item_counts.item_count DESC NULLS LAST, c.name ASC
+            LEFT JOIN category_counters cc ON c.id = cc.category_id
+            ORDER BY COALESCE(cc.item_count, 0) DESC, c.name ASC
         ''').fetchall()
         
         # Get total inventory count for percentages
-        total_items = conn.execute('''
-            SELECT COUNT(*) as count FROM inventory WHERE deleted_at IS NULL
-        ''').fetchone()['count']
+        total_items = get_counters(conn)['inventory_items']
         
         conn.close()
         
@@ -1,7 +1,7 @@
 # routes/dashboard.py
 
 from flask import Blueprint, request, jsonify
-from backend.database import get_db_connection
+from backend.database import get_snapshot_connection, epoch_ago, get_counters
 from datetime import datetime, timedelta
 import json
 
@@ -11,7 +11,7 @@ dashboard_bp = Blueprint('dashboard', __name__)
 def get_dashboard_stats():
     """Get comprehensive dashboard statistics including category breakdown and warranty alerts"""
     try:
-        conn = get_db_connection()
+        conn = get_snapshot_connection()
         
         # Category statistics with proper joins
         category_stats = conn.execute('''
@@ -60,32 +60,34 @@ def get_dashboard_stats():
 def get_dashboard_overview():
     """Get high-level dashboard overview metrics"""
     try:
-        conn = get_db_connection()
-        
-        # Device counts and status
-        device_stats = conn.execute('''
-            SELECT 
-                COUNT(*) as total_devices,
-                COUNT(CASE WHEN is_ignored = 0 THEN 1 END) as active_devices,
-                COUNT(CASE WHEN is_ignored = 1 THEN 1 END) as ignored_devices,
-                COUNT(CASE WHEN datetime(first_seen) > datetime('now', '-24 hours') THEN 1 END) as new_devices_24h,
-                COUNT(CASE WHEN datetime(last_seen) > datetime('now', '-1 hour') THEN 1 END) as online_devices,
-                COUNT(CASE WHEN datetime(last_seen) <= datetime('now', '-24 hours') THEN 1 END) as offline_devices
-            FROM devices
-        ''').fetchone()
+        conn = get_snapshot_connection()
+        counters = get_counters(conn)
+        
+        # Device counts and status (time windows are indexed range counts)
+        device_stats = {
+            'total_devices': counters['devices_total'],
+            'active_devices': counters['devices_total'] - counters['devices_ignored'],
+            'ignored_devices': counters['devices_ignored'],
+            **conn.execute('''
+                SELECT 
+                    (SELECT COUNT(*) FROM devices WHERE first_seen_ts > :day_ago) as new_devices_24h,
+                    (SELECT COUNT(*) FROM devices WHERE last_seen_ts > :hour_ago) as online_devices,
+                    (SELECT COUNT(*) FROM devices WHERE last_seen_ts <= :day_ago) as offline_devices
+            ''', {'hour_ago': epoch_ago(3600), 'day_ago': epoch_ago(86400)}).fetchone()
+        }
         
         # Inventory counts and value
-        inventory_stats = conn.execute('''
-            SELECT 
-                COUNT(*) as total_items,
-                COUNT(CASE WHEN device_id IS NOT NULL THEN 1 END) as networked_items,
-                COUNT(CASE WHEN device_id IS NULL THEN 1 END) as manual_items,
-                COUNT(CASE WHEN price IS NOT NULL AND CAST(price as REAL) > 0 THEN 1 END) as items_with_price,
-                COALESCE(SUM(CAST(price as REAL)), 0) as total_value,
-                COUNT(CASE WHEN datetime(created_at) > datetime('now', '-30 days') THEN 1 END) as recent_additions
-            FROM inventory 
-            WHERE deleted_at IS NULL
-        ''').fetchone()
+        inventory_stats = {
+            'total_items': counters['inventory_items'],
+            'networked_items': counters['inventory_networked'],
+            'manual_items': counters['inventory_items'] - counters['inventory_networked'],
+            'items_with_price': counters['inventory_priced'],
+            'total_value': counters['inventory_value'],
+            'recent_additions': conn.execute('''
+                SELECT COUNT(*) FROM inventory
+                WHERE deleted_at IS NULL AND created_at_ts > ?
+            ''', (epoch_ago(30 * 86400),)).fetchone()[0]
+        }
         
         # Warranty status breakdown
         warranty_stats = conn.execute('''
@@ -106,7 +108,7 @@ def get_dashboard_overview():
                 first_seen as timestamp,
                 'discovered' as action
             FROM devices 
-            WHERE datetime(first_seen) > datetime('now', '-7 days')
+            WHERE first_seen_ts > :week_ago
             
             UNION ALL
             
@@ -117,19 +119,19 @@ def get_dashboard_overview():
                 'added' as action
             FROM inventory 
             WHERE deleted_at IS NULL 
-            AND datetime(created_at) > datetime('now', '-7 days')
+            AND created_at_ts > :week_ago
             
             ORDER BY timestamp DESC
             LIMIT 10
-        ''').fetchall()
+        ''', {'week_ago': epoch_ago(7 * 86400)}).fetchall()
         
         conn.close()
         
         return jsonify({
             'status': 'success',
             'overview': {
-                'devices': dict(device_stats),
-                'inventory': dict(inventory_stats),
+                'devices': device_stats,
+                'inventory': inventory_stats,
                 'warranty': dict(warranty_stats),
                 'recent_activity': [dict(row) for row in recent_activity]
             }
@@ -142,54 +144,54 @@ def get_dashboard_overview():
 def get_network_health():
     """Get network health metrics for dashboard"""
     try:
-        conn = get_db_connection()
+        conn = get_snapshot_connection()
         
         # Device status distribution
         device_status = conn.execute('''
             SELECT 
                 CASE 
-                    WHEN datetime(last_seen) > datetime('now', '-1 hour') THEN 'online'
-                    WHEN datetime(last_seen) > datetime('now', '-1 day') THEN 'unknown'
+                    WHEN last_seen_ts > :hour_ago THEN 'online'
+                    WHEN last_seen_ts > :day_ago THEN 'unknown'
                     ELSE 'offline'
                 END as status,
                 COUNT(*) as count
             FROM devices
             WHERE is_ignored = 0
             GROUP BY status
-        ''').fetchall()
+        ''', {'hour_ago': epoch_ago(3600), 'day_ago': epoch_ago(86400)}).fetchall()
         
         # Network coverage by IP ranges
         network_ranges = conn.execute('''
             SELECT 
                 SUBSTR(ip_address, 1, INSTR(ip_address || '.', '.', INSTR(ip_address || '.', '.', INSTR(ip_address || '.', '.') + 1)) - 1) as network_prefix,
                 COUNT(*) as device_count,
-                COUNT(CASE WHEN datetime(last_seen) > datetime('now', '-1 hour') THEN 1 END) as online_count
+                COUNT(CASE WHEN last_seen_ts > ? THEN 1 END) as online_count
             FROM devices 
             WHERE ip_address IS NOT NULL AND is_ignored = 0
             GROUP BY network_prefix
             ORDER BY device_count DESC
             LIMIT 10
-        ''').fetchall()
+        ''', (epoch_ago(3600),)).fetchall()
         
         # Vendor distribution
         vendor_stats = conn.execute('''
             SELECT 
                 COALESCE(vendor, 'Unknown') as vendor,
                 COUNT(*) as count,
-                COUNT(CASE WHEN datetime(last_seen) > datetime('now', '-1 hour') THEN 1 END) as online_count
+                COUNT(CASE WHEN last_seen_ts > ? THEN 1 END) as online_count
             FROM devices
             WHERE is_ignored = 0
             GROUP BY vendor
             ORDER BY count DESC
             LIMIT 10
-        ''').fetchall()
+        ''', (epoch_ago(3600),)).fetchall()
         
         # Network health score calculation
         total_devices = conn.execute('SELECT COUNT(*) as count FROM devices WHERE is_ignored = 0').fetchone()['count']
         online_devices = conn.execute('''
             SELECT COUNT(*) as count FROM devices 
-            WHERE is_ignored = 0 AND datetime(last_seen) > datetime('now', '-1 hour')
-        ''').fetchone()['count']
+            WHERE is_ignored = 0 AND last_seen_ts > ?
+        ''', (epoch_ago(3600),)).fetchone()['count']
         
         health_score = round((online_devices / total_devices * 100) if total_devices > 0 else 0, 1)
         
@@ -214,7 +216,7 @@ def get_network_health():
 def get_inventory_metrics():
     """Get inventory value and metrics"""
     try:
-        conn = get_db_connection()
+        conn = get_snapshot_connection()
         
         # Inventory values by category
         inventory_values = conn.execute('''
@@ -258,8 +260,8 @@ def get_inventory_metrics():
                 COALESCE(SUM(CAST(price as REAL)), 0) as total_value
             FROM inventory
             WHERE deleted_at IS NULL
-            AND datetime(created_at) > datetime('now', '-30 days')
-        ''').fetchone()
+            AND created_at_ts > ?
+        ''', (epoch_ago(30 * 86400),)).fetchone()
         
         # Most valuable items
         top_items = conn.execute('''
@@ -294,7 +296,7 @@ def get_dashboard_timeline():
         days = request.args.get('days', 30, type=int)
         days = max(1, min(days, 365))  # Limit between 1 and 365 days
         
-        conn = get_db_connection()
+        conn = get_snapshot_connection()
         
         # Device discovery timeline
         device_timeline = conn.execute('''
@@ -302,10 +304,10 @@ def get_dashboard_timeline():
                 DATE(first_seen) as date,
                 COUNT(*) as devices_discovered
             FROM devices 
-            WHERE datetime(first_seen) > datetime('now', '-{} days')
+            WHERE first_seen_ts > ?
             GROUP BY DATE(first_seen)
             ORDER BY date ASC
-        '''.format(days)).fetchall()
+        ''', (epoch_ago(days * 86400),)).fetchall()
         
         # Inventory additions timeline
         inventory_timeline = conn.execute('''
@@ -315,10 +317,10 @@ def get_dashboard_timeline():
                 COALESCE(SUM(CAST(price as REAL)), 0) as value_added
             FROM inventory 
             WHERE deleted_at IS NULL 
-            AND datetime(created_at) > datetime('now', '-{} days')
+            AND created_at_ts > ?
             GROUP BY DATE(created_at)
             ORDER BY date ASC
-        '''.format(days)).fetchall()
+        ''', (epoch_ago(days * 86400),)).fetchall()
         
         conn.close()
         
@@ -352,7 +354,7 @@ def get_dashboard_timeline():
 def get_dashboard_alerts():
     """Get important alerts and notifications for the dashboard"""
     try:
-        conn = get_db_connection()
+        conn = get_snapshot_connection()
         
         alerts = []
         
@@ -395,10 +397,10 @@ def get_dashboard_alerts():
                    (julianday('now') - julianday(last_seen)) as days_offline
             FROM devices 
             WHERE is_ignored = 0
-            AND datetime(last_seen) <= datetime('now', '-24 hours')
-            ORDER BY last_seen ASC
+            AND last_seen_ts <= ?
+            ORDER BY last_seen_ts ASC
             LIMIT 10
-        ''').fetchall()
+        ''', (epoch_ago(86400),)).fetchall()
         
         for device in offline_devices:
             days_offline = int(device['days_offline'])
@@ -431,10 +433,10 @@ def get_dashboard_alerts():
             LEFT JOIN inventory i ON d.id = i.device_id AND i.deleted_at IS NULL
             WHERE d.is_ignored = 0 
             AND i.device_id IS NULL
-            AND datetime(d.first_seen) > datetime('now', '-7 days')
-            ORDER BY d.first_seen DESC
+            AND d.first_seen_ts > ?
+            ORDER BY d.first_seen_ts DESC
             LIMIT 5
-        ''').fetchall()
+        ''', (epoch_ago(7 * 86400),)).fetchall()
         
         for device in new_devices:
             device_name = device['hostname'] or device['ip_address'] or 'Unknown Device'
@@ -454,10 +456,10 @@ def get_dashboard_alerts():
             FROM inventory 
             WHERE deleted_at IS NULL 
             AND device_id IS NULL
-            AND datetime(created_at) > datetime('now', '-30 days')
-            ORDER BY created_at DESC
+            AND created_at_ts > ?
+            ORDER BY created_at_ts DESC
             LIMIT 3
-        ''').fetchall()
+        ''', (epoch_ago(30 * 86400),)).fetchall()
         
         for item in orphaned_inventory:
             alerts.append({
@@ -494,23 +496,28 @@ def get_dashboard_alerts():
 def get_quick_stats():
     """Get quick statistics for dashboard cards/widgets"""
     try:
-        conn = get_db_connection()
-        
-        # Quick counts for dashboard cards
-        stats = conn.execute('''
-            SELECT 
-                (SELECT COUNT(*) FROM devices WHERE is_ignored = 0) as total_devices,
-                (SELECT COUNT(*) FROM devices WHERE is_ignored = 0 AND datetime(last_seen) > datetime('now', '-1 hour')) as online_devices,
-                (SELECT COUNT(*) FROM inventory WHERE deleted_at IS NULL) as inventory_items,
-                (SELECT COUNT(*) FROM devices WHERE is_ignored = 0 AND datetime(first_seen) > datetime('now', '-24 hours')) as new_devices_24h,
-                (SELECT COALESCE(SUM(CAST(price as REAL)), 0) FROM inventory WHERE deleted_at IS NULL AND price IS NOT NULL) as total_inventory_value,
-                (SELECT COUNT(*) FROM inventory WHERE deleted_at IS NULL AND warranty_expiry IS NOT NULL AND DATE(warranty_expiry) <= DATE('now', '+30 days')) as warranty_alerts
-        ''').fetchone()
+        conn = get_snapshot_connection()
+        counters = get_counters(conn)
+        
+        # Quick counts for dashboard cards; only the time windows need a query
+        stats = {
+            'total_devices': counters['devices_total'] - counters['devices_ignored'],
+            'inventory_items': counters['inventory_items'],
+            'total_inventory_value': counters['inventory_value'],
+            **conn.execute('''
+                SELECT 
+                    (SELECT COUNT(*) FROM devices WHERE is_ignored = 0 AND last_seen_ts > :hour_ago) as online_devices,
+                    (SELECT COUNT(*) FROM devices WHERE is_ignored = 0 AND first_seen_ts > :day_ago) as new_devices_24h,
+                    (SELECT COUNT(*) FROM inventory WHERE deleted_at IS NULL AND warranty_expiry IS NOT NULL AND DATE(warranty_expiry) <= DATE('now', '+30 days')) as warranty_alerts
+            ''', {'hour_ago': epoch_ago(3600), 'day_ago': epoch_ago(86400)}).fetchone()
+        }
         
         # Last scan time
         last_scan = conn.execute('''
-            SELECT MAX(last_seen) as last_scan_time
+            SELECT last_seen as last_scan_time
             FROM devices
+            ORDER BY last_seen_ts DESC
+            LIMIT 1
         ''').fetchone()
         
         conn.close()
@@ -1,17 +1,75 @@
 # routes/devices.py (complete device API routes)
 
 from flask import Blueprint, request, jsonify
-from backend.database import get_db_connection, add_device
+from backend.database import get_db_connection, add_device, epoch_ago, notify_devices_changed
+from routes.pagination import parse_list_args, keyset_condition, stream_rows
 from datetime import datetime, timedelta
 
 devices_bp = Blueprint('devices', __name__)
 
+# Sort keys map to indexed columns (the id tie-break comes from the rowid)
+DEVICE_SORTS = {'last_seen': 'd.last_seen_ts', 'first_seen': 'd.first_seen_ts', 'id': 'd.id'}
+DEVICE_FIELDS = (
+    'id', 'mac_address', 'ip_address', 'hostname', 'vendor', 'device_type', 'first_seen',
+    'last_seen', 'is_monitored', 'is_ignored', 'notes', 'first_seen_ts', 'last_seen_ts'
+)
+
 @devices_bp.route('/devices', methods=['GET'])
 def get_devices():
+    """List devices as a streamed JSON array
+    
+    Optional parameters: sort (last_seen, first_seen, id), order (asc, desc),
+    status (online, unknown, offline), ignored (0/1), managed (0/1) and
+    fields (comma separated). Pass limit to page through the results; the
+    cursor for the next page is returned in the X-Next-Cursor header.
+    """
+    try:
+        sort_column, descending, limit, cursor, fields = parse_list_args(DEVICE_SORTS, DEVICE_FIELDS)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    
+    conditions = []
+    params = []
+    
+    status = request.args.get('status')
+    if status == 'online':
+        conditions.append('d.last_seen_ts > ?')
+        params.append(epoch_ago(3600))
+    elif status == 'unknown':
+        conditions.append('d.last_seen_ts > ? AND d.last_seen_ts <= ?')
+        params.extend([epoch_ago(86400), epoch_ago(3600)])
+    elif status == 'offline':
+        conditions.append('d.last_seen_ts <= ?')
+        params.append(epoch_ago(86400))
+    elif status:
+        return jsonify({'status': 'error', 'message': 'Invalid status, expected online, unknown or offline'}), 400
+    
+    if request.args.get('ignored') in ('0', '1'):
+        conditions.append('d.is_ignored = ?')
+        params.append(int(request.args['ignored']))
+    
+    if request.args.get('managed') in ('0', '1'):
+        managed = 'EXISTS (SELECT 1 FROM inventory i WHERE i.device_id = d.id AND i.deleted_at IS NULL)'
+        conditions.append(managed if request.args['managed'] == '1' else f'NOT {managed}')
+    
+    if cursor:
+        conditions.append(keyset_condition(sort_column, 'd.id', descending))
+        params.extend(cursor)
+    
+    columns = ', '.join(f'd.{field}' for field in fields) if fields else 'd.*'
+    direction = 'DESC' if descending else 'ASC'
+    query = f'''
+        SELECT {columns}, {sort_column} as _sort_key, d.id as _sort_id
+        FROM devices d
+        {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+        ORDER BY {sort_column} {direction}, d.id {direction}
+    '''
+    if limit is not None:
+        query += ' LIMIT ?'
+        params.append(limit + 1)
+    
     conn = get_db_connection()
-    devices = conn.execute('SELECT * FROM devices ORDER BY last_seen DESC').fetchall()
-    conn.close()
-    return jsonify([dict(device) for device in devices])
+    return stream_rows(conn, conn.execute(query, params), limit)
 
 @devices_bp.route('/devices/timeline', methods=['GET'])
 def get_devices_timeline():
@@ -26,10 +84,10 @@ def get_devices_timeline():
                 DATE(first_seen) as date,
                 COUNT(*) as count
             FROM devices 
-            WHERE datetime(first_seen) > datetime('now', '-{} days')
+            WHERE first_seen_ts > ?
             GROUP BY DATE(first_seen)
             ORDER BY date ASC
-        '''.format(days)).fetchall()
+        ''', (epoch_ago(days * 86400),)).fetchall()
         conn.close()
         
         # Fill in missing dates with zero counts
@@ -54,6 +112,23 @@ def get_devices_timeline():
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+@devices_bp.route('/devices/backfill-vendors', methods=['POST'])
+def backfill_device_vendors():
+    """Re-resolve vendors for devices stored as 'Unknown'"""
+    try:
+        from flask import current_app
+        scanner = current_app.scanner
+        updated = scanner.backfill_vendors()
+        
+        return jsonify({
+            'status': 'success',
+            'message': f'Updated vendor for {updated} device(s)',
+            'updated_count': updated,
+            'vendor_db_ready': scanner.vendor_db_ready.is_set()
+        })
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 @devices_bp.route('/devices/<int:device_id>/ignore', methods=['POST'])
 def ignore_device(device_id):
     try:
@@ -61,6 +136,7 @@ def ignore_device(device_id):
         conn.execute('UPDATE devices SET is_ignored = 1 WHERE id = ?', (device_id,))
         conn.commit()
         conn.close()
+        notify_devices_changed([device_id])
         return jsonify({'status': 'success'})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -81,6 +157,7 @@ def unignore_device(device_id):
         conn.execute('UPDATE devices SET is_ignored = 0 WHERE id = ?', (device_id,))
         conn.commit()
         conn.close()
+        notify_devices_changed([device_id])
         return jsonify({'status': 'success', 'message': 'Device unignored successfully'})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -100,6 +177,7 @@ def bulk_ignore_devices():
         affected_rows = conn.total_changes
         conn.commit()
         conn.close()
+        notify_devices_changed(device_ids)
         
         return jsonify({
             'status': 'success', 
@@ -124,6 +202,7 @@ def bulk_unignore_devices():
         affected_rows = conn.total_changes
         conn.commit()
         conn.close()
+        notify_devices_changed(device_ids)
         
         return jsonify({
             'status': 'success', 
@@ -1,15 +1,75 @@
+import re
 from flask import Blueprint, request, jsonify
-from backend.database import get_db_connection
+from backend.database import get_db_connection, get_snapshot_connection, epoch_ago, get_counters
 from services.export_service import ExportService
+from routes.pagination import (
+    parse_list_args, keyset_condition, stream_rows, encode_cursor, decode_cursor, MAX_PAGE_SIZE
+)
 
 inventory_bp = Blueprint('inventory', __name__)
 
+# bm25 column weights for inventory_fts: name, brand, model, serial_number, notes, hostname
+SEARCH_RANK = 'bm25(inventory_fts, 10.0, 4.0, 4.0, 6.0, 1.0, 3.0)'
+SEARCH_MATCHES = ('prefix', 'substring', 'filter')
+
+def build_search_query(text):
+    """Turn free text into an FTS5 query matching every word as a prefix, or None if it has no words"""
+    terms = re.findall(r'\w+', text)
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"*' for term in terms)
+
+# Sort keys map to indexed columns (the id tie-break comes from the rowid)
+INVENTORY_SORTS = {'created_at': 'i.created_at_ts', 'id': 'i.id'}
+
+# Output field -> column expression in the inventory/devices/categories join
+INVENTORY_FIELDS = {
+    **{field: f'i.{field}' for field in (
+        'id', 'device_id', 'name', 'category_id', 'category', 'brand', 'model', 'purchase_date',
+        'warranty_expiry', 'store_vendor', 'price', 'serial_number', 'notes', 'photo_path',
+        'receipt_path', 'deleted_at', 'created_at', 'updated_at', 'created_at_ts'
+    )},
+    'ip_address': 'd.ip_address',
+    'mac_address': 'd.mac_address',
+    'hostname': 'd.hostname',
+    'category_name': 'c.name',
+    'category_icon': 'c.icon',
+    'category_color': 'c.color',
+}
+
 @inventory_bp.route('/inventory', methods=['GET'])
 def get_inventory():
-    """Get all inventory items with device and category information"""
-    conn = get_db_connection()
-    inventory = conn.execute('''
-        SELECT 
+    """Get inventory items with device and category information as a streamed JSON array
+    
+    Optional parameters: sort (created_at, id), order (asc, desc),
+    category_id, networked (0/1) and fields (comma separated). Pass limit to
+    page through the results; the cursor for the next page is returned in
+    the X-Next-Cursor header.
+    """
+    try:
+        sort_column, descending, limit, cursor, fields = parse_list_args(INVENTORY_SORTS, INVENTORY_FIELDS)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    
+    conditions = ['i.deleted_at IS NULL']
+    params = []
+    
+    category_id = request.args.get('category_id', type=int)
+    if category_id is not None:
+        conditions.append('i.category_id = ?')
+        params.append(category_id)
+    
+    if request.args.get('networked') in ('0', '1'):
+        conditions.append('i.device_id IS NOT NULL' if request.args['networked'] == '1' else 'i.device_id IS NULL')
+    
+    if cursor:
+        conditions.append(keyset_condition(sort_column, 'i.id', descending))
+        params.extend(cursor)
+    
+    if fields:
+        columns = ', '.join(f'{INVENTORY_FIELDS[field]} as {field}' for field in fields)
+    else:
+        columns = '''
             i.*, 
             d.ip_address, 
             d.mac_address,
@@ -17,15 +77,22 @@ def get_inventory():
             c.name as category_name,
             c.icon as category_icon,
             c.color as category_color
+        '''
+    direction = 'DESC' if descending else 'ASC'
+    query = f'''
+        SELECT {columns}, {sort_column} as _sort_key, i.id as _sort_id
         FROM inventory i
         LEFT JOIN devices d ON i.device_id = d.id
         LEFT JOIN categories c ON i.category_id = c.id
-        WHERE i.deleted_at IS NULL
-        ORDER BY i.created_at DESC
-    ''').fetchall()
-    conn.close()
+        WHERE {' AND '.join(conditions)}
+        ORDER BY {sort_column} {direction}, i.id {direction}
+    '''
+    if limit is not None:
+        query += ' LIMIT ?'
+        params.append(limit + 1)
     
-    return jsonify([dict(item) for item in inventory])
+    conn = get_db_connection()
+    return stream_rows(conn, conn.execute(query, params), limit)
 
 @inventory_bp.route('/inventory', methods=['POST'])
 def add_inventory():
@@ -280,16 +347,21 @@ def bulk_delete_inventory():
 
 @inventory_bp.route('/inventory/export/<format_type>', methods=['GET'])
 def export_inventory(format_type):
-    """Export inventory data in various formats"""
+    """Export inventory data in various formats (add ?gzip=1 for a compressed download)"""
     try:
         export_service = ExportService()
+        compress = request.args.get('gzip', '').lower() in ('1', 'true')
         
         if format_type.lower() == 'csv':
-            return export_service.export_inventory_csv()
+            return export_service.export_inventory_csv(compress)
         elif format_type.lower() == 'json':
-            return export_service.export_inventory_json()
+            return export_service.export_inventory_json(compress)
+        elif format_type.lower() == 'ndjson':
+            return export_service.export_inventory_ndjson(compress)
         elif format_type.lower() == 'report':
-            return export_service.export_combined_report()
+            return export_service.export_combined_report(compress)
+        elif format_type.lower() == 'devices':
+            return export_service.export_devices_csv(compress)
         else:
             return jsonify({'status': 'error', 'message': 'Invalid export format'}), 400
             
@@ -300,12 +372,11 @@ def export_inventory(format_type):
 def get_inventory_stats():
     """Get inventory statistics"""
     try:
-        conn = get_db_connection()
+        conn = get_snapshot_connection()
         
         # Basic counts
-        total_items = conn.execute('''
-            SELECT COUNT(*) as count FROM inventory WHERE deleted_at IS NULL
-        ''').fetchone()['count']
+        counters = get_counters(conn)
+        total_items = counters['inventory_items']
         
         # Category breakdown
         category_stats = conn.execute('''
@@ -336,11 +407,9 @@ def get_inventory_stats():
             GROUP BY status
         ''').fetchall()
         
-        # Value statistics
+        # Value statistics (count and total come from the counters)
         value_stats = conn.execute('''
             SELECT 
-                COUNT(CASE WHEN price IS NOT NULL AND CAST(price as REAL) > 0 THEN 1 END) as items_with_price,
-                COALESCE(SUM(CAST(price as REAL)), 0) as total_value,
                 COALESCE(AVG(CAST(price as REAL)), 0) as average_value,
                 COALESCE(MAX(CAST(price as REAL)), 0) as highest_value
             FROM inventory 
@@ -352,8 +421,8 @@ def get_inventory_stats():
             SELECT COUNT(*) as count
             FROM inventory
             WHERE deleted_at IS NULL 
-            AND datetime(created_at) > datetime('now', '-30 days')
-        ''').fetchone()['count']
+            AND created_at_ts > ?
+        ''', (epoch_ago(30 * 86400),)).fetchone()['count']
         
         conn.close()
         
@@ -365,8 +434,8 @@ def get_inventory_stats():
                 'category_breakdown': [dict(row) for row in category_stats],
                 'warranty_status': [dict(row) for row in warranty_stats],
                 'value_stats': {
-                    'items_with_price': value_stats['items_with_price'],
-                    'total_value': round(value_stats['total_value'], 2),
+                    'items_with_price': counters['inventory_priced'],
+                    'total_value': round(counters['inventory_value'], 2),
                     'average_value': round(value_stats['average_value'], 2),
                     'highest_value': round(value_stats['highest_value'], 2)
                 }
@@ -378,68 +447,119 @@ def get_inventory_stats():
 
 @inventory_bp.route('/inventory/search', methods=['GET'])
 def search_inventory():
-    """Search inventory items"""
+    """Search inventory items
+    
+    Text search first uses the inventory_fts index: every word must match the
+    start of a word in the name, brand, model, serial number, notes or
+    hostname, ranked by relevance. Matching is by word prefix, so "ds9" finds
+    "DS920+" but "920" does not. When that finds nothing, the same fields are
+    searched for the text anywhere (the LIKE match used before the index),
+    newest first. Filter-only searches are ordered by last update.
+    
+    Results come in pages of `limit` (default 100, max 1000). has_more says
+    whether more results exist, and passing next_cursor back as `cursor`
+    returns the next page. 'match' reports which rule was used: 'prefix',
+    'substring' or 'filter'.
+    """
     try:
         query = request.args.get('q', '').strip()
         category = request.args.get('category', '').strip()
         warranty_status = request.args.get('warranty_status', '').strip()
+        limit = max(1, min(request.args.get('limit', 100, type=int), MAX_PAGE_SIZE))
+        cursor = request.args.get('cursor')
         
         if not query and not category and not warranty_status:
             return jsonify({'status': 'error', 'message': 'No search criteria provided'}), 400
         
-        conn = get_db_connection()
+        # The cursor carries the match rule, so every page uses the same one
+        match, offset = decode_cursor(cursor) if cursor else (None, 0)
+        if cursor and (match not in SEARCH_MATCHES or offset < 0 or (match == 'filter') != (not query)):
+            raise ValueError('Invalid cursor')
         
-        # Build WHERE clause
-        where_conditions = ['i.deleted_at IS NULL']
-        params = []
-        
-        if query:
-            where_conditions.append('''
-                (i.name LIKE ? OR i.brand LIKE ? OR i.model LIKE ? OR 
-                 i.serial_number LIKE ? OR i.notes LIKE ? OR d.hostname LIKE ?)
-            ''')
-            like_query = f'%{query}%'
-            params.extend([like_query] * 6)
+        # Filters shared by every match rule
+        filter_conditions = ['i.deleted_at IS NULL']
+        filter_params = []
         
         if category:
-            where_conditions.append('(c.name = ? OR i.category = ?)')
-            params.extend([category, category])
+            filter_conditions.append('(c.name = ? OR i.category = ?)')
+            filter_params.extend([category, category])
         
         if warranty_status:
             if warranty_status == 'expired':
-                where_conditions.append('i.warranty_expiry < DATE("now")')
+                filter_conditions.append('i.warranty_expiry < DATE("now")')
             elif warranty_status == 'expiring':
-                where_conditions.append('i.warranty_expiry BETWEEN DATE("now") AND DATE("now", "+30 days")')
+                filter_conditions.append('i.warranty_expiry BETWEEN DATE("now") AND DATE("now", "+30 days")')
             elif warranty_status == 'active':
-                where_conditions.append('i.warranty_expiry > DATE("now", "+30 days")')
+                filter_conditions.append('i.warranty_expiry > DATE("now", "+30 days")')
             elif warranty_status == 'unknown':
-                where_conditions.append('i.warranty_expiry IS NULL')
+                filter_conditions.append('i.warranty_expiry IS NULL')
         
-        where_clause = ' AND '.join(where_conditions)
+        conn = get_db_connection()
         
-        results = conn.execute(f'''
-            SELECT 
-                i.*, 
-                d.ip_address, 
-                d.mac_address,
-                d.hostname,
-                c.name as category_name,
-                c.icon as category_icon,
-                c.color as category_color
-            FROM inventory i
-            LEFT JOIN devices d ON i.device_id = d.id
-            LEFT JOIN categories c ON i.category_id = c.id
-            WHERE {where_clause}
-            ORDER BY i.updated_at DESC
-        ''', params).fetchall()
+        def run_search(match):
+            where_conditions = list(filter_conditions)
+            params = list(filter_params)
+            source = 'inventory i'
+            order_by = 'i.updated_at DESC, i.id DESC'
+            
+            if match == 'prefix':
+                where_conditions.append('inventory_fts MATCH ?')
+                params.append(build_search_query(query))
+                source = 'inventory_fts INNER JOIN inventory i ON i.id = inventory_fts.rowid'
+                order_by = f'{SEARCH_RANK}, i.id'
+            elif match == 'substring':
+                where_conditions.append('''
+                    (i.name LIKE ? OR i.brand LIKE ? OR i.model LIKE ? OR 
+                     i.serial_number LIKE ? OR i.notes LIKE ? OR d.hostname LIKE ?)
+                ''')
+                params.extend([f'%{query}%'] * 6)
+            
+            # One extra row tells whether there is another page
+            return conn.execute(f'''
+                SELECT 
+                    i.*, 
+                    d.ip_address, 
+                    d.mac_address,
+                    d.hostname,
+                    c.name as category_name,
+                    c.icon as category_icon,
+                    c.color as category_color
+                FROM {source}
+                LEFT JOIN devices d ON i.device_id = d.id
+                LEFT JOIN categories c ON i.category_id = c.id
+                WHERE {' AND '.join(where_conditions)}
+                ORDER BY {order_by}
+                LIMIT ? OFFSET ?
+            ''', params + [limit + 1, offset]).fetchall()
+        
+        if match is not None:
+            results = run_search(match)
+        elif not query:
+            match = 'filter'
+            results = run_search(match)
+        else:
+            # Queries with no words (e.g. only punctuation) can't use the index
+            match = 'prefix' if build_search_query(query) else 'substring'
+            results = run_search(match)
+            if not results and match == 'prefix':
+                match = 'substring'
+                results = run_search(match)
         
         conn.close()
         
+        has_more = len(results) > limit
+        results = results[:limit]
+        
         return jsonify({
             'status': 'success',
             'results': [dict(item) for item in results],
-            'count': len(results)
+            'count': len(results),
+            'match': match,
+            'has_more': has_more,
+            'next_cursor': encode_cursor(match, offset + limit) if has_more else None
         })
         
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
\ No newline at end of file
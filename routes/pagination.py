@@ -0,0 +1,90 @@
+# routes/pagination.py (shared helpers for paged, streamed list endpoints)
+
+import base64
+import json
+from flask import Response, request, stream_with_context
+
+MAX_PAGE_SIZE = 1000
+STREAM_CHUNK_ROWS = 200
+
+def encode_cursor(sort_key, row_id):
+    """Opaque cursor pointing just past the row with this sort key and id"""
+    return base64.urlsafe_b64encode(json.dumps([sort_key, row_id]).encode()).decode()
+
+def decode_cursor(cursor):
+    try:
+        sort_key, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return sort_key, int(row_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def parse_list_args(sorts, fields):
+    """Read the common list parameters from the request
+
+    Returns (sort_column, descending, limit, cursor, selected_fields). limit
+    is None when the caller did not ask for paging, and selected_fields is
+    None when every field should be returned. Raises ValueError on bad input.
+    """
+    sort = request.args.get('sort', next(iter(sorts)))
+    if sort not in sorts:
+        raise ValueError(f"Invalid sort '{sort}', expected one of: {', '.join(sorts)}")
+
+    order = request.args.get('order', 'desc').lower()
+    if order not in ('asc', 'desc'):
+        raise ValueError("Invalid order, expected 'asc' or 'desc'")
+
+    limit = request.args.get('limit', type=int)
+    cursor = request.args.get('cursor')
+    if cursor and limit is None:
+        raise ValueError('cursor requires limit')
+    if limit is not None:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    selected = None
+    if request.args.get('fields'):
+        selected = [field.strip() for field in request.args['fields'].split(',') if field.strip()]
+        unknown = [field for field in selected if field not in fields]
+        if unknown:
+            raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+
+    return sorts[sort], order == 'desc', limit, decode_cursor(cursor) if cursor else None, selected
+
+def keyset_condition(sort_column, id_column, descending):
+    """WHERE clause fragment selecting rows after a (sort key, id) cursor"""
+    return f"({sort_column}, {id_column}) {'<' if descending else '>'} (?, ?)"
+
+def stream_rows(conn, rows, limit=None):
+    """Stream query rows as a JSON array and close the connection when done
+
+    Rows must carry _sort_key and _sort_id columns, which are left out of the
+    output. When paging, the query should fetch limit + 1 rows; the extra one
+    only signals another page, whose cursor is sent in the X-Next-Cursor header.
+    """
+    next_cursor = None
+    if limit is not None:
+        rows = rows.fetchmany(limit + 1)
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]['_sort_key'], rows[-1]['_sort_id'])
+
+    def generate():
+        try:
+            yield '['
+            chunk = []
+            first = True
+            for row in rows:
+                item = {key: row[key] for key in row.keys() if key not in ('_sort_key', '_sort_id')}
+                chunk.append(('' if first else ',') + json.dumps(item))
+                first = False
+                if len(chunk) >= STREAM_CHUNK_ROWS:
+                    yield ''.join(chunk)
+                    chunk = []
+            chunk.append(']')
+            yield ''.join(chunk)
+        finally:
+            conn.close()
+
+    response = Response(stream_with_context(generate()), mimetype='application/json')
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
@@ -1,5 +1,5 @@
 from flask import Blueprint, jsonify
-from backend.database import get_db_connection
+from backend.database import get_counters, get_devices_by_ids
 
 scanning_bp = Blueprint('scanning', __name__)
 
@@ -22,30 +22,53 @@ def trigger_scan():
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+@scanning_bp.route('/scan/stop', methods=['POST'])
+def stop_scan():
+    """Cancel the running network scan, keeping devices found so far"""
+    try:
+        from flask import current_app
+        result = current_app.realtime_monitor.force_stop_scan()
+        
+        return jsonify({
+            'status': 'success' if result['stopped'] else 'error',
+            **result
+        })
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+@scanning_bp.route('/scan/results/<scan_id>', methods=['GET'])
+def get_scan_results(scan_id):
+    """Devices found by a recent scan, as referenced by scan_complete"""
+    try:
+        from flask import current_app
+        device_ids = current_app.realtime_monitor.get_scan_results(scan_id)
+        
+        if device_ids is None:
+            return jsonify({'status': 'error', 'message': 'Scan results not found'}), 404
+        
+        devices = get_devices_by_ids(device_ids)
+        
+        return jsonify({
+            'status': 'success',
+            'scan_id': scan_id,
+            'devices': devices,
+            'count': len(devices)
+        })
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
 @scanning_bp.route('/scanning/stats', methods=['GET'])
 def get_scanning_stats():
     """Get scanning-specific statistics"""
     try:
-        conn = get_db_connection()
-        
-        total_devices = conn.execute('SELECT COUNT(*) as count FROM devices').fetchone()['count']
-        managed_devices = conn.execute('''
-            SELECT COUNT(*) as count FROM devices d
-            INNER JOIN inventory i ON d.id = i.device_id
-            WHERE i.deleted_at IS NULL
-        ''').fetchone()['count']
-        unmanaged_devices = conn.execute('''
-            SELECT COUNT(*) as count FROM devices d
-            LEFT JOIN inventory i ON d.id = i.device_id
-            WHERE (i.device_id IS NULL OR i.deleted_at IS NOT NULL)
-            AND d.is_ignored = 0
-        ''').fetchone()['count']
-        ignored_devices = conn.execute('''
-            SELECT COUNT(*) as count FROM devices 
-            WHERE is_ignored = 1
-        ''').fetchone()['count']
-        
-        conn.close()
+        counters = get_counters()
+        
+        total_devices = counters['devices_total']
+        managed_devices = counters['devices_managed']
+        ignored_devices = counters['devices_ignored']
+        # Not ignored and not in active inventory
+        unmanaged_devices = (total_devices - ignored_devices
+                             - (managed_devices - counters['devices_managed_ignored']))
         
         return jsonify({
             'total_devices': total_devices,
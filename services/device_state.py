@@ -0,0 +1,218 @@
+import heapq
+import threading
+import time
+from backend.database import get_db_connection, SQL_BATCH_SIZE
+
+# Seconds since last seen at which a device becomes 'unknown', then 'offline'
+STATUS_TRANSITION_AGES = (3600, 86400)
+
+DEVICE_STATE_QUERY = '''
+    SELECT id, mac_address, ip_address, hostname, vendor, is_ignored, last_seen, last_seen_ts, first_seen_ts
+    FROM devices
+'''
+
+def device_status_for_age(seconds):
+    """Classify a device by how long ago it was last seen"""
+    if seconds < STATUS_TRANSITION_AGES[0]:
+        return 'online'
+    elif seconds < STATUS_TRANSITION_AGES[1]:
+        return 'unknown'
+    return 'offline'
+
+class DeviceStateCache:
+    """In-memory status of every device, shared by the monitor and socket handlers
+
+    Warmed with one table read, then kept current by refresh() whenever devices
+    are saved or edited, and by apply_due() as status transitions come due.
+    Each device's next transition sits in a heap of (deadline, device id,
+    last_seen_ts); deadlines are never removed, and one whose last_seen_ts no
+    longer matches the device is simply skipped when it comes due.
+    """
+
+    def __init__(self):
+        self._devices = {}
+        self._deadlines = []
+        self._counts = self._empty_counts()
+        self._active_counts = self._empty_counts()  # Devices that are not ignored
+        self._lock = threading.Lock()
+        self.loaded = False
+
+    @staticmethod
+    def _empty_counts():
+        return {'online': 0, 'offline': 0, 'unknown': 0}
+
+    def load(self):
+        """Read and classify every device, replacing whatever is cached"""
+        conn = get_db_connection()
+        devices = conn.execute(DEVICE_STATE_QUERY).fetchall()
+        conn.close()
+
+        now = time.time()
+        with self._lock:
+            self._devices = {}
+            self._deadlines = []
+            self._counts = self._empty_counts()
+            self._active_counts = self._empty_counts()
+            for device in devices:
+                self._store(device, now)
+            self.loaded = True
+        print(f"Device state cache loaded with {len(devices)} devices")
+
+    def _ensure_loaded(self):
+        if not self.loaded:
+            self.load()
+
+    def _count(self, info, delta):
+        self._counts[info['status']] += delta
+        if not info['is_ignored']:
+            self._active_counts[info['status']] += delta
+
+    def _store(self, device, now):
+        """Cache a device row, returning the info it replaced (or None)"""
+        old = self._devices.get(device['id'])
+        last_seen_ts = device['last_seen_ts'] or now
+        info = {
+            'status': device_status_for_age(now - last_seen_ts),
+            'mac_address': device['mac_address'],
+            'ip_address': device['ip_address'],
+            'hostname': device['hostname'],
+            'vendor': device['vendor'],
+            'is_ignored': bool(device['is_ignored']),
+            'last_seen': device['last_seen'],
+            'last_seen_ts': last_seen_ts,
+            'first_seen_ts': device['first_seen_ts'] or now
+        }
+
+        if old is not None:
+            self._count(old, -1)
+        self._count(info, 1)
+        self._devices[device['id']] = info
+
+        # An edit that was not a sighting keeps the deadline already queued
+        if old is None or old['last_seen_ts'] != last_seen_ts:
+            self._schedule(device['id'], last_seen_ts, now)
+        return old
+
+    def _schedule(self, device_id, last_seen_ts, now):
+        for age in STATUS_TRANSITION_AGES:
+            if last_seen_ts + age > now:
+                heapq.heappush(self._deadlines, (last_seen_ts + age, device_id, last_seen_ts))
+                return
+
+    def _compact(self, now):
+        """Drop superseded deadlines once they clearly outnumber the live ones"""
+        if len(self._deadlines) <= 4 * len(self._devices) + 64:
+            return
+        self._deadlines = []
+        for device_id, info in self._devices.items():
+            self._schedule(device_id, info['last_seen_ts'], now)
+
+    @staticmethod
+    def _change(device_id, info, old_status):
+        return {
+            'device_id': device_id,
+            'device_info': dict(info),
+            'old_status': old_status,
+            'new_status': info['status']
+        }
+
+    def refresh(self, device_ids):
+        """Re-read the given devices after they were saved or edited
+
+        Returns (status_changes, counts_changed). A newly added device is a
+        change with an old_status of None.
+        """
+        if not self.loaded or not device_ids:
+            return [], False
+
+        device_ids = list(device_ids)
+        conn = get_db_connection()
+        devices = []
+        for i in range(0, len(device_ids), SQL_BATCH_SIZE):
+            batch = device_ids[i:i + SQL_BATCH_SIZE]
+            placeholders = ','.join(['?' for _ in batch])
+            devices.extend(conn.execute(f'{DEVICE_STATE_QUERY} WHERE id IN ({placeholders})', batch))
+        conn.close()
+
+        now = time.time()
+        changes = []
+        counts_changed = False
+        with self._lock:
+            for device in devices:
+                old = self._store(device, now)
+                info = self._devices[device['id']]
+                if old is None:
+                    changes.append(self._change(device['id'], info, None))
+                elif old['status'] != info['status']:
+                    changes.append(self._change(device['id'], info, old['status']))
+                elif old['is_ignored'] != info['is_ignored']:
+                    counts_changed = True
+            self._compact(now)
+
+        return changes, counts_changed or bool(changes)
+
+    def apply_due(self, now=None):
+        """Apply every status transition whose deadline has passed
+
+        Only the devices that are due are looked at. Returns the status changes.
+        """
+        self._ensure_loaded()
+        if now is None:
+            now = time.time()
+
+        changes = []
+        with self._lock:
+            while self._deadlines and self._deadlines[0][0] <= now:
+                _, device_id, last_seen_ts = heapq.heappop(self._deadlines)
+                info = self._devices.get(device_id)
+                if info is None or info['last_seen_ts'] != last_seen_ts:
+                    continue  # Seen again since this was scheduled
+
+                old_status = info['status']
+                self._count(info, -1)
+                info['status'] = device_status_for_age(now - last_seen_ts)
+                self._count(info, 1)
+                if info['status'] != old_status:
+                    changes.append(self._change(device_id, info, old_status))
+                self._schedule(device_id, last_seen_ts, now)
+        return changes
+
+    def next_deadline(self):
+        """Unix time of the next status transition, or None if none is pending"""
+        with self._lock:
+            return self._deadlines[0][0] if self._deadlines else None
+
+    def counts(self, include_ignored=True):
+        """Devices per status"""
+        self._ensure_loaded()
+        with self._lock:
+            return dict(self._counts if include_ignored else self._active_counts)
+
+    def snapshot(self):
+        """Counts and the status of every device, for clients (re)syncing"""
+        self._ensure_loaded()
+        with self._lock:
+            return {
+                'counts': dict(self._counts),
+                'devices': {device_id: info['status'] for device_id, info in self._devices.items()}
+            }
+
+    def discovered_since(self, since):
+        """Number of devices first seen after the given Unix time"""
+        self._ensure_loaded()
+        with self._lock:
+            return sum(1 for info in self._devices.values() if info['first_seen_ts'] > since)
+
+    def get(self, device_id):
+        """Cached info for one device, or None if it is unknown"""
+        self._ensure_loaded()
+        with self._lock:
+            info = self._devices.get(device_id)
+            return dict(info) if info else None
+
+    def status_of(self, device_id):
+        info = self.get(device_id)
+        return info['status'] if info else 'unknown'
+
+    def __len__(self):
+        return len(self._devices)
@@ -3,149 +3,237 @@
 import csv
 import json
 import io
+import textwrap
+import zlib
 from datetime import datetime
-from flask import make_response
-from backend.database import get_db_connection
+from flask import Response, stream_with_context
+from backend.database import get_snapshot_connection, get_counters
+
+# Rows fetched from the cursor per batch, and so written per output chunk
+EXPORT_BATCH_SIZE = 500
+
+INVENTORY_EXPORT_QUERY = '''
+    SELECT i.*, d.ip_address, d.mac_address, d.hostname, c.name as category_name
+    FROM inventory i
+    LEFT JOIN devices d ON i.device_id = d.id
+    LEFT JOIN categories c ON i.category_id = c.id
+    WHERE i.deleted_at IS NULL
+    ORDER BY i.created_at_ts DESC
+'''
+
+DEVICES_EXPORT_QUERY = '''
+    SELECT d.*, i.name as inventory_name, i.category
+    FROM devices d
+    LEFT JOIN inventory i ON d.id = i.device_id AND i.deleted_at IS NULL
+    ORDER BY d.last_seen_ts DESC
+'''
 
 class ExportService:
-    """Service for handling inventory data exports"""
-    
+    """Service for handling inventory data exports
+
+    Exports are streamed: rows are read from the cursor in batches and
+    written out as each batch is formatted, so memory use does not depend on
+    the number of rows. Every export can optionally be gzip-compressed on
+    the fly. Each export reads from a single snapshot, so it is consistent
+    even while a scan is writing.
+    """
+
     @staticmethod
-    def export_inventory_csv():
-        """Export inventory to CSV format"""
+    def _batches(query, params=(), conn=None):
+        """Yield lists of rows from a query, EXPORT_BATCH_SIZE at a time
+
+        Reads from the given snapshot connection, or a new one, and closes it
+        once the rows are exhausted.
+        """
+        if conn is None:
+            conn = get_snapshot_connection()
         try:
-            conn = get_db_connection()
-            inventory = conn.execute('''
-                SELECT i.*, d.ip_address, d.mac_address, d.hostname, c.name as category_name
-                FROM inventory i
-                LEFT JOIN devices d ON i.device_id = d.id
-                LEFT JOIN categories c ON i.category_id = c.id
-                WHERE i.deleted_at IS NULL
-                ORDER BY i.created_at DESC
-            ''').fetchall()
+            cursor = conn.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+                if not rows:
+                    break
+                yield rows
+        finally:
             conn.close()
-            
-            output = io.StringIO()
-            writer = csv.writer(output)
-            
-            # Write header
-            writer.writerow([
-                'ID', 'Name', 'Category', 'Brand', 'Model', 'Purchase Date', 
-                'Warranty Expiry', 'Store/Vendor', 'Price', 'Serial Number', 
-                'IP Address', 'MAC Address', 'Hostname', 'Notes', 'Created At'
-            ])
-            
-            # Write data
-            for item in inventory:
-                writer.writerow([
-                    item['id'],
-                    item['name'],
-                    item['category_name'] or item['category'] or '',
-                    item['brand'] or '',
-                    item['model'] or '',
-                    item['purchase_date'] or '',
-                    item['warranty_expiry'] or '',
-                    item['store_vendor'] or '',
-                    item['price'] or '',
-                    item['serial_number'] or '',
-                    item['ip_address'] or '',
-                    item['mac_address'] or '',
-                    item['hostname'] or '',
-                    item['notes'] or '',
-                    item['created_at']
-                ])
-            
+
+    @staticmethod
+    def _csv_chunks(header, batches, to_row):
+        """Write the header, then one CSV chunk per batch of rows"""
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(header)
+        yield output.getvalue()
+
+        for rows in batches:
             output.seek(0)
-            
-            response = make_response(output.getvalue())
-            response.headers['Content-Type'] = 'text/csv'
-            response.headers['Content-Disposition'] = f'attachment; filename=inventory_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
-            
-            return response
-            
+            output.truncate()
+            writer.writerows(to_row(row) for row in rows)
+            yield output.getvalue()
+
+    @staticmethod
+    def _json_chunks(metadata, list_key, batches, to_item, count_key=None):
+        """Write a JSON object whose list_key array is filled batch by batch
+
+        The metadata keys come first. If count_key is given, the number of
+        items is added after the array, once it is known.
+        """
+        head = json.dumps(metadata, indent=2)[:-2]
+        yield f'{head},\n  "{list_key}": ['
+
+        count = 0
+        for rows in batches:
+            items = []
+            for row in rows:
+                item = textwrap.indent(json.dumps(to_item(row), indent=2), '    ')
+                items.append(('\n' if count == 0 else ',\n') + item)
+                count += 1
+            yield ''.join(items)
+
+        tail = '\n  ]' if count else ']'
+        if count_key:
+            tail += f',\n  "{count_key}": {count}'
+        yield tail + '\n}\n'
+
+    @staticmethod
+    def _ndjson_chunks(batches, to_item):
+        """Write one JSON object per line"""
+        for rows in batches:
+            yield ''.join(json.dumps(to_item(row)) + '\n' for row in rows)
+
+    @staticmethod
+    def _gzip_chunks(chunks):
+        compressor = zlib.compressobj(wbits=31)  # gzip container
+        for chunk in chunks:
+            # Sync flush so each batch reaches the client as soon as it is written
+            yield compressor.compress(chunk.encode('utf-8')) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+
+    @staticmethod
+    def _streamed_response(chunks, content_type, filename, compress=False):
+        if compress:
+            chunks = ExportService._gzip_chunks(chunks)
+            content_type = 'application/gzip'
+            filename += '.gz'
+
+        response = Response(stream_with_context(chunks), content_type=content_type)
+        response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+        return response
+
+    @staticmethod
+    def _timestamp():
+        return datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    @staticmethod
+    def _inventory_row(item):
+        return [
+            item['id'],
+            item['name'],
+            item['category_name'] or item['category'] or '',
+            item['brand'] or '',
+            item['model'] or '',
+            item['purchase_date'] or '',
+            item['warranty_expiry'] or '',
+            item['store_vendor'] or '',
+            item['price'] or '',
+            item['serial_number'] or '',
+            item['ip_address'] or '',
+            item['mac_address'] or '',
+            item['hostname'] or '',
+            item['notes'] or '',
+            item['created_at']
+        ]
+
+    @staticmethod
+    def _inventory_item(item):
+        return {
+            'id': item['id'],
+            'name': item['name'],
+            'category': item['category_name'] or item['category'],
+            'brand': item['brand'],
+            'model': item['model'],
+            'purchase_date': item['purchase_date'],
+            'warranty_expiry': item['warranty_expiry'],
+            'store_vendor': item['store_vendor'],
+            'price': item['price'],
+            'serial_number': item['serial_number'],
+            'ip_address': item['ip_address'],
+            'mac_address': item['mac_address'],
+            'hostname': item['hostname'],
+            'notes': item['notes'],
+            'created_at': item['created_at'],
+            'updated_at': item['updated_at']
+        }
+
+    @staticmethod
+    def export_inventory_csv(compress=False):
+        """Export inventory to CSV format"""
+        try:
+            chunks = ExportService._csv_chunks(
+                [
+                    'ID', 'Name', 'Category', 'Brand', 'Model', 'Purchase Date',
+                    'Warranty Expiry', 'Store/Vendor', 'Price', 'Serial Number',
+                    'IP Address', 'MAC Address', 'Hostname', 'Notes', 'Created At'
+                ],
+                ExportService._batches(INVENTORY_EXPORT_QUERY),
+                ExportService._inventory_row
+            )
+
+            return ExportService._streamed_response(
+                chunks, 'text/csv',
+                f'inventory_export_{ExportService._timestamp()}.csv', compress
+            )
+
         except Exception as e:
             raise Exception(f"CSV export failed: {str(e)}")
 
     @staticmethod
-    def export_inventory_json():
+    def export_inventory_json(compress=False):
         """Export inventory to JSON format"""
         try:
-            conn = get_db_connection()
-            inventory = conn.execute('''
-                SELECT i.*, d.ip_address, d.mac_address, d.hostname, c.name as category_name
-                FROM inventory i
-                LEFT JOIN devices d ON i.device_id = d.id
-                LEFT JOIN categories c ON i.category_id = c.id
-                WHERE i.deleted_at IS NULL
-                ORDER BY i.created_at DESC
-            ''').fetchall()
-            conn.close()
-            
-            # Convert to list of dictionaries
-            data = []
-            for item in inventory:
-                data.append({
-                    'id': item['id'],
-                    'name': item['name'],
-                    'category': item['category_name'] or item['category'],
-                    'brand': item['brand'],
-                    'model': item['model'],
-                    'purchase_date': item['purchase_date'],
-                    'warranty_expiry': item['warranty_expiry'],
-                    'store_vendor': item['store_vendor'],
-                    'price': item['price'],
-                    'serial_number': item['serial_number'],
-                    'ip_address': item['ip_address'],
-                    'mac_address': item['mac_address'],
-                    'hostname': item['hostname'],
-                    'notes': item['notes'],
-                    'created_at': item['created_at'],
-                    'updated_at': item['updated_at']
-                })
-            
-            export_data = {
+            metadata = {
                 'export_date': datetime.now().isoformat(),
-                'total_items': len(data),
                 'application': 'HomeTier',
-                'version': '1.0.0',
-                'inventory': data
+                'version': '1.0.0'
             }
-            
-            response = make_response(json.dumps(export_data, indent=2))
-            response.headers['Content-Type'] = 'application/json'
-            response.headers['Content-Disposition'] = f'attachment; filename=inventory_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json'
-            
-            return response
-            
+            chunks = ExportService._json_chunks(
+                metadata, 'inventory',
+                ExportService._batches(INVENTORY_EXPORT_QUERY),
+                ExportService._inventory_item,
+                count_key='total_items'
+            )
+
+            return ExportService._streamed_response(
+                chunks, 'application/json',
+                f'inventory_export_{ExportService._timestamp()}.json', compress
+            )
+
         except Exception as e:
             raise Exception(f"JSON export failed: {str(e)}")
 
     @staticmethod
-    def export_devices_csv():
+    def export_inventory_ndjson(compress=False):
+        """Export inventory as newline-delimited JSON, one item per line"""
+        try:
+            chunks = ExportService._ndjson_chunks(
+                ExportService._batches(INVENTORY_EXPORT_QUERY),
+                ExportService._inventory_item
+            )
+
+            return ExportService._streamed_response(
+                chunks, 'application/x-ndjson',
+                f'inventory_export_{ExportService._timestamp()}.ndjson', compress
+            )
+
+        except Exception as e:
+            raise Exception(f"NDJSON export failed: {str(e)}")
+
+    @staticmethod
+    def export_devices_csv(compress=False):
         """Export devices to CSV format"""
         try:
-            conn = get_db_connection()
-            devices = conn.execute('''
-                SELECT d.*, i.name as inventory_name, i.category
-                FROM devices d
-                LEFT JOIN inventory i ON d.id = i.device_id AND i.deleted_at IS NULL
-                ORDER BY d.last_seen DESC
-            ''').fetchall()
-            conn.close()
-            
-            output = io.StringIO()
-            writer = csv.writer(output)
-            
-            # Write header
-            writer.writerow([
-                'ID', 'MAC Address', 'IP Address', 'Hostname', 'Vendor', 
-                'Device Type', 'First Seen', 'Last Seen', 'Is Monitored', 
-                'Is Ignored', 'Inventory Name', 'Category', 'Notes'
-            ])
-            
-            # Write data
-            for device in devices:
-                writer.writerow([
+            def device_row(device):
+                return [
                     device['id'],
                     device['mac_address'],
                     device['ip_address'] or '',
@@ -159,53 +247,36 @@ class ExportService:
                     device['inventory_name'] or '',
                     device['category'] or '',
                     device['notes'] or ''
-                ])
-            
-            output.seek(0)
-            
-            response = make_response(output.getvalue())
-            response.headers['Content-Type'] = 'text/csv'
-            response.headers['Content-Disposition'] = f'attachment; filename=devices_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
-            
-            return response
-            
+                ]
+
+            chunks = ExportService._csv_chunks(
+                [
+                    'ID', 'MAC Address', 'IP Address', 'Hostname', 'Vendor',
+                    'Device Type', 'First Seen', 'Last Seen', 'Is Monitored',
+                    'Is Ignored', 'Inventory Name', 'Category', 'Notes'
+                ],
+                ExportService._batches(DEVICES_EXPORT_QUERY),
+                device_row
+            )
+
+            return ExportService._streamed_response(
+                chunks, 'text/csv',
+                f'devices_export_{ExportService._timestamp()}.csv', compress
+            )
+
         except Exception as e:
             raise Exception(f"Devices CSV export failed: {str(e)}")
 
     @staticmethod
-    def export_combined_report():
+    def export_combined_report(compress=False):
         """Export combined inventory and devices report"""
         try:
-            conn = get_db_connection()
-            
-            # Get inventory with device info
-            inventory = conn.execute('''
-                SELECT 
-                    i.*,
-                    d.ip_address,
-                    d.mac_address,
-                    d.hostname,
-                    d.vendor,
-                    d.first_seen,
-                    d.last_seen,
-                    c.name as category_name,
-                    c.color as category_color,
-                    CASE 
-                        WHEN i.warranty_expiry IS NULL THEN 'Unknown'
-                        WHEN DATE(i.warranty_expiry) < DATE('now') THEN 'Expired'
-                        WHEN DATE(i.warranty_expiry) <= DATE('now', '+30 days') THEN 'Expiring Soon'
-                        ELSE 'Active'
-                    END as warranty_status
-                FROM inventory i
-                LEFT JOIN devices d ON i.device_id = d.id
-                LEFT JOIN categories c ON i.category_id = c.id
-                WHERE i.deleted_at IS NULL
-                ORDER BY i.created_at DESC
-            ''').fetchall()
-            
+            # Summary and rows come from the same snapshot, so they always agree
+            conn = get_snapshot_connection()
+
             # Get summary statistics
             stats = conn.execute('''
-                SELECT 
+                SELECT
                     COUNT(DISTINCT i.id) as total_inventory,
                     COUNT(DISTINCT d.id) as total_devices,
                     COUNT(DISTINCT CASE WHEN d.is_ignored = 0 THEN d.id END) as active_devices,
@@ -216,11 +287,9 @@ class ExportService:
                 LEFT JOIN devices d ON i.device_id = d.id
                 WHERE i.deleted_at IS NULL
             ''').fetchone()
-            
-            conn.close()
-            
-            # Build comprehensive report data
-            report_data = {
+
+            # Summary goes out first; the inventory rows follow as they are read
+            metadata = {
                 'export_date': datetime.now().isoformat(),
                 'report_type': 'Combined Inventory and Devices Report',
                 'application': 'HomeTier',
@@ -232,13 +301,11 @@ class ExportService:
                     'ignored_devices': stats['ignored_devices'],
                     'expired_warranties': stats['expired_warranties'],
                     'total_inventory_value': round(stats['total_value'], 2)
-                },
-                'inventory_items': []
+                }
             }
-            
-            # Add detailed inventory data
-            for item in inventory:
-                report_data['inventory_items'].append({
+
+            def report_item(item):
+                return {
                     'id': item['id'],
                     'name': item['name'],
                     'category': item['category_name'] or item['category'],
@@ -261,14 +328,40 @@ class ExportService:
                     'notes': item['notes'],
                     'created_at': item['created_at'],
                     'updated_at': item['updated_at']
-                })
-            
-            response = make_response(json.dumps(report_data, indent=2))
-            response.headers['Content-Type'] = 'application/json'
-            response.headers['Content-Disposition'] = f'attachment; filename=hometier_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json'
-            
-            return response
-            
+                }
+
+            # Get inventory with device info
+            inventory = ExportService._batches('''
+                SELECT
+                    i.*,
+                    d.ip_address,
+                    d.mac_address,
+                    d.hostname,
+                    d.vendor,
+                    d.first_seen,
+                    d.last_seen,
+                    c.name as category_name,
+                    c.color as category_color,
+                    CASE
+                        WHEN i.warranty_expiry IS NULL THEN 'Unknown'
+                        WHEN DATE(i.warranty_expiry) < DATE('now') THEN 'Expired'
+                        WHEN DATE(i.warranty_expiry) <= DATE('now', '+30 days') THEN 'Expiring Soon'
+                        ELSE 'Active'
+                    END as warranty_status
+                FROM inventory i
+                LEFT JOIN devices d ON i.device_id = d.id
+                LEFT JOIN categories c ON i.category_id = c.id
+                WHERE i.deleted_at IS NULL
+                ORDER BY i.created_at_ts DESC
+            ''', conn=conn)
+
+            chunks = ExportService._json_chunks(metadata, 'inventory_items', inventory, report_item)
+
+            return ExportService._streamed_response(
+                chunks, 'application/json',
+                f'hometier_report_{ExportService._timestamp()}.json', compress
+            )
+
         except Exception as e:
             raise Exception(f"Combined report export failed: {str(e)}")
 
@@ -276,41 +369,29 @@ class ExportService:
     def get_export_stats():
         """Get statistics about what can be exported"""
         try:
-            conn = get_db_connection()
-            
-            inventory_count = conn.execute('''
-                SELECT COUNT(*) as count FROM inventory WHERE deleted_at IS NULL
-            ''').fetchone()['count']
-            
-            devices_count = conn.execute('''
-                SELECT COUNT(*) as count FROM devices
-            ''').fetchone()['count']
-            
-            categories_count = conn.execute('''
-                SELECT COUNT(*) as count FROM categories
-            ''').fetchone()['count']
-            
-            total_value = conn.execute('''
-                SELECT COALESCE(SUM(CAST(price as REAL)), 0) as total
-                FROM inventory WHERE deleted_at IS NULL AND price IS NOT NULL
-            ''').fetchone()['total']
-            
-            conn.close()
-            
+            counters = get_counters()
+
+            inventory_count = counters['inventory_items']
+            devices_count = counters['devices_total']
+            categories_count = counters['categories_total']
+            total_value = counters['inventory_value']
+
             return {
                 'inventory_items': inventory_count,
                 'discovered_devices': devices_count,
                 'categories': categories_count,
                 'total_inventory_value': round(total_value, 2),
-                'export_formats': ['CSV', 'JSON'],
+                'export_formats': ['CSV', 'JSON', 'NDJSON'],
                 'available_exports': [
                     'inventory_csv',
-                    'inventory_json', 
+                    'inventory_json',
+                    'inventory_ndjson',
                     'devices_csv',
                     'combined_report'
-                ]
+                ],
+                'compression': ['gzip']
             }
-            
+
         except Exception as e:
             return {
                 'error': f"Failed to get export stats: {str(e)}",
@@ -318,4 +399,4 @@ class ExportService:
                 'discovered_devices': 0,
                 'categories': 0,
                 'total_inventory_value': 0.0
-            }
\ No newline at end of file
+            }
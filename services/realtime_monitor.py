@@ -1,16 +1,48 @@
 import threading
 import time
+import uuid
+from collections import OrderedDict, deque
 from datetime import datetime
-from backend.database import get_db_connection, add_device
+from backend.database import (
+    get_db_connection, add_devices, add_device_listener, epoch_ago, get_monitor_cursor, set_monitor_cursor
+)
+from backend.scanner import ScanCancelToken
+from services.device_state import DeviceStateCache
+from services.scan_events import ScanEventBatcher
+
+NEW_DEVICE_CHECK_INTERVAL = 15
+NEW_DEVICE_BATCH_SIZE = 500
+SCAN_RESULTS_KEPT = 3  # Recent scan results available by scan id
+STATUS_DELTA_HISTORY = 500  # Deltas kept for clients catching up after a reconnect
+
+# Socket.IO rooms clients join for the pages they show; events go only to these
+TOPICS = ('scan', 'status', 'inventory', 'alerts')
 
 class RealtimeMonitor:
-    def __init__(self, socketio, scanner):
+    def __init__(self, socketio, scanner, device_state=None):
         self.socketio = socketio
         self.scanner = scanner
-        self.previous_device_status = {}
+        self.device_state = device_state if device_state is not None else DeviceStateCache()
+        self._wake = threading.Event()
+        # Status deltas are numbered so clients can spot gaps and resync. The
+        # numbers restart with the process, so each run has its own boot id.
+        self.boot_id = uuid.uuid4().hex[:12]
+        self.status_seq = 0
+        self._status_log = deque(maxlen=STATUS_DELTA_HISTORY)
+        self._status_log_lock = threading.Lock()
+        self._last_counts = None
+        self._new_device_cursor = None  # Highest device id already announced
+        self._new_device_lock = threading.Lock()
         self.scan_in_progress = False
+        self.scan_cancel = None
+        self.scan_thread = None
+        self.scan_results = OrderedDict()  # scan id -> ids of the devices found
+        self.subscribers = {topic: set() for topic in TOPICS}  # topic -> client sids
+        self._subscribers_lock = threading.Lock()
         self.monitoring_active = False
         
+        add_device_listener(self.note_device_changes)
+        
     def start_monitoring(self):
         """Start real-time device monitoring"""
         if self.monitoring_active:
@@ -19,11 +51,17 @@ class RealtimeMonitor:
         self.monitoring_active = True
         
         def monitor_loop():
+            next_new_device_check = 0
             while self.monitoring_active:
                 try:
                     self.check_device_status_changes()
-                    self.check_new_devices()
-                    time.sleep(15)  # Check every 15 seconds
+                    if time.time() >= next_new_device_check:
+                        self.check_new_devices()
+                        next_new_device_check = time.time() + NEW_DEVICE_CHECK_INTERVAL
+                    
+                    # Sleep until the next transition is due; sightings wake us early
+                    self._wake.wait(self._seconds_until_next_check(next_new_device_check))
+                    self._wake.clear()
                 except Exception as e:
                     print(f"Error in monitoring loop: {e}")
                     time.sleep(30)
@@ -32,218 +70,297 @@ class RealtimeMonitor:
         monitor_thread.start()
         print("Real-time monitoring started")
         
+    def subscribe(self, sid, topics):
+        """Record a client's topic rooms; returns the valid topics it joined"""
+        topics = [topic for topic in topics if topic in TOPICS]
+        with self._subscribers_lock:
+            for topic in topics:
+                self.subscribers[topic].add(sid)
+        return topics
+    
+    def unsubscribe(self, sid, topics=TOPICS):
+        with self._subscribers_lock:
+            for topic in topics:
+                if topic in self.subscribers:
+                    self.subscribers[topic].discard(sid)
+    
+    def has_subscribers(self, topic):
+        return bool(self.subscribers[topic])
+    
+    def publish(self, topic, event, payload):
+        """Emit to a topic room, unless nobody is subscribed to it"""
+        if self.has_subscribers(topic):
+            self.socketio.emit(event, payload, to=topic)
+        
     def stop_monitoring(self):
         """Stop real-time monitoring"""
         self.monitoring_active = False
+        self._wake.set()
         
+    def note_device_changes(self, device_ids):
+        """Refresh devices that were just saved or edited (device listener)"""
+        try:
+            changes, counts_changed = self.device_state.refresh(device_ids)
+            
+            # The next deadline may now be sooner than the one the loop is waiting on
+            self._wake.set()
+            self._emit_status_changes(changes, counts_changed)
+            
+        except Exception as e:
+            print(f"Error updating device state: {e}")
+    
     def check_device_status_changes(self):
-        """Check for device status changes and emit updates"""
+        """Apply the status transitions that are due and emit updates"""
         try:
-            conn = get_db_connection()
-            devices = conn.execute('SELECT * FROM devices').fetchall()
-            conn.close()
+            changes = self.device_state.apply_due()
+            self._emit_status_changes(changes, bool(changes))
+            return changes
             
-            current_status = {}
-            status_changes = []
-            now = datetime.now()
+        except Exception as e:
+            print(f"Error checking device status: {e}")
+            return []
+    
+    def _emit_status_changes(self, changes, counts_changed):
+        """Broadcast what changed as one numbered device_status_delta
+        
+        Deltas carry absolute values (a device's new status, the new value of
+        each count that moved), so applying one twice is harmless. Nothing is
+        sent when nothing changed.
+        """
+        if not changes and not counts_changed:
+            return
+        
+        with self._status_log_lock:
+            if not self.has_subscribers('status'):
+                # Nobody to tell. Move the sequence on and forget the log so
+                # anyone who syncs later gets a snapshot instead of a gap.
+                self.status_seq += 1
+                self._status_log.clear()
+                self._last_counts = None
+                return
             
-            for device in devices:
-                device_dict = dict(device)
-                device_id = device_dict['id']
-                last_seen_str = device_dict['last_seen']
-                
-                if last_seen_str:
-                    try:
-                        last_seen = datetime.fromisoformat(last_seen_str.replace('Z', '+00:00'))
-                    except:
-                        last_seen = datetime.fromisoformat(last_seen_str)
-                else:
-                    last_seen = now
-                
-                time_diff = (now - last_seen).total_seconds()
-                if time_diff < 3600:
-                    status = 'online'
-                elif time_diff < 86400:
-                    status = 'unknown'
-                else:
-                    status = 'offline'
-                
-                current_status[device_id] = {
-                    'status': status,
-                    'last_seen': device_dict['last_seen'],
-                    'ip_address': device_dict['ip_address'],
-                    'hostname': device_dict['hostname'],
-                    'vendor': device_dict['vendor']
-                }
-                
-                if device_id in self.previous_device_status:
-                    old_status = self.previous_device_status[device_id]['status']
-                    if old_status != status:
-                        status_changes.append({
-                            'device_id': device_id,
-                            'device_info': current_status[device_id],
-                            'old_status': old_status,
-                            'new_status': status,
-                            'timestamp': now.isoformat()
-                        })
+            delta = {}
+            if changes:
+                delta['changes'] = [{
+                    'device_id': change['device_id'],
+                    'status': change['new_status'],
+                    'name': (change['device_info']['hostname'] or change['device_info']['ip_address']
+                             or change['device_info']['mac_address'])
+                } for change in changes]
             
-            if status_changes:
-                self.socketio.emit('device_status_changes', {
-                    'changes': status_changes,
-                    'timestamp': now.isoformat()
-                })
-                
-            self.previous_device_status = current_status
+            if counts_changed:
+                counts = self.device_state.counts()
+                moved = {status: count for status, count in counts.items()
+                         if self._last_counts is None or self._last_counts.get(status) != count}
+                self._last_counts = counts
+                if moved:
+                    delta['counts'] = moved
             
-            status_counts = {'online': 0, 'offline': 0, 'unknown': 0}
-            for device_status in current_status.values():
-                status_counts[device_status['status']] += 1
-                
-            self.socketio.emit('device_status_counts', status_counts)
+            if not delta:
+                return
             
-        except Exception as e:
-            print(f"Error checking device status: {e}")
+            self.status_seq += 1
+            delta['seq'] = self.status_seq
+            delta['boot_id'] = self.boot_id
+            self._status_log.append(delta)
+            # Sent under the lock so clients receive deltas in sequence order
+            self.socketio.emit('device_status_delta', delta, to='status')
+    
+    def get_status_sync(self, since=None, boot_id=None):
+        """What a client needs to catch up from sequence number `since`
+        
+        Returns the missed deltas if they are all still in the log, otherwise
+        a full snapshot. A client whose boot_id is from an earlier run of the
+        server always gets a snapshot, since its sequence numbers mean nothing
+        now. Either way 'seq' and 'boot_id' are what to continue from.
+        """
+        with self._status_log_lock:
+            sync = {'seq': self.status_seq, 'boot_id': self.boot_id}
+            if boot_id == self.boot_id and since is not None and 0 <= since <= self.status_seq:
+                if since == self.status_seq:
+                    return {**sync, 'deltas': []}
+                if self._status_log and self._status_log[0]['seq'] <= since + 1:
+                    return {**sync, 'deltas': [delta for delta in self._status_log if delta['seq'] > since]}
+            
+            return {**sync, 'snapshot': self.device_state.snapshot()}
+    
+    def get_device_current_status(self, device_id):
+        """Current status of one device from the device state cache"""
+        return self.device_state.status_of(device_id)
+    
+    def _seconds_until_next_check(self, next_new_device_check):
+        """How long the monitor loop can sleep before something is due"""
+        wake_at = next_new_device_check
+        next_deadline = self.device_state.next_deadline()
+        if next_deadline is not None:
+            wake_at = min(wake_at, next_deadline)
+        return max(0, wake_at - time.time())
             
     def check_new_devices(self):
-        """Check for newly discovered devices"""
+        """Announce devices added since the last check, each exactly once
+        
+        Device ids only ever grow (and SQLite commits writers in id order), so
+        everything past the persisted high-water mark is new. Each check is a
+        primary key range read.
+        """
         try:
-            conn = get_db_connection()
-            recent_devices = conn.execute('''
-                SELECT * FROM devices 
-                WHERE datetime(first_seen) > datetime('now', '-1 minute')
-                ORDER BY first_seen DESC
-            ''').fetchall()
-            conn.close()
-            
-            if recent_devices:
-                new_devices = []
-                for device in recent_devices:
-                    device_dict = dict(device)
-                    new_devices.append({
-                        'id': device_dict['id'],
-                        'ip_address': device_dict['ip_address'],
-                        'mac_address': device_dict['mac_address'],
-                        'hostname': device_dict['hostname'],
-                        'vendor': device_dict['vendor'],
-                        'first_seen': device_dict['first_seen']
-                    })
+            with self._new_device_lock:
+                if self._new_device_cursor is None:
+                    self._new_device_cursor = get_monitor_cursor('new_devices')
                 
-                self.socketio.emit('new_devices_discovered', {
-                    'devices': new_devices,
-                    'count': len(new_devices),
-                    'timestamp': datetime.now().isoformat()
-                })
+                if not self.has_subscribers('status'):
+                    # Nobody is listening: skip past the new devices without reading them
+                    conn = get_db_connection()
+                    latest_id = conn.execute('SELECT MAX(id) FROM devices').fetchone()[0] or 0
+                    conn.close()
+                    if latest_id > self._new_device_cursor:
+                        self._new_device_cursor = latest_id
+                        set_monitor_cursor('new_devices', latest_id)
+                    return
+                
+                while True:
+                    conn = get_db_connection()
+                    recent_devices = conn.execute('''
+                        SELECT id, ip_address, mac_address, hostname, vendor, first_seen
+                        FROM devices
+                        WHERE id > ?
+                        ORDER BY id
+                        LIMIT ?
+                    ''', (self._new_device_cursor, NEW_DEVICE_BATCH_SIZE)).fetchall()
+                    conn.close()
+                    
+                    if not recent_devices:
+                        break
+                    
+                    new_devices = [dict(device) for device in recent_devices]
+                    self.socketio.emit('new_devices_discovered', {
+                        'devices': new_devices,
+                        'count': len(new_devices),
+                        'timestamp': datetime.now().isoformat()
+                    }, to='status')
+                    
+                    self._new_device_cursor = new_devices[-1]['id']
+                    set_monitor_cursor('new_devices', self._new_device_cursor)
+                    
+                    if len(recent_devices) < NEW_DEVICE_BATCH_SIZE:
+                        break
                 
         except Exception as e:
             print(f"Error checking new devices: {e}")
 
-    def send_current_status(self):
-        """Send current device status to requesting client"""
+    def send_current_status(self, to=None):
+        """Send current device status counts to one client (or everyone)"""
         try:
-            conn = get_db_connection()
-            devices = conn.execute('SELECT * FROM devices').fetchall()
-            conn.close()
-            
-            status_counts = {'online': 0, 'offline': 0, 'unknown': 0}
-            now = datetime.now()
-            
-            for device in devices:
-                device_dict = dict(device)
-                last_seen_str = device_dict['last_seen']
-                
-                if last_seen_str:
-                    try:
-                        last_seen = datetime.fromisoformat(last_seen_str.replace('Z', '+00:00'))
-                    except:
-                        last_seen = datetime.fromisoformat(last_seen_str)
-                else:
-                    last_seen = now
-                    
-                time_diff = (now - last_seen).total_seconds()
-                
-                if time_diff < 3600:
-                    status_counts['online'] += 1
-                elif time_diff < 86400:
-                    status_counts['unknown'] += 1
-                else:
-                    status_counts['offline'] += 1
-                    
-            self.socketio.emit('device_status_counts', status_counts)
+            self.socketio.emit('device_status_counts', self.device_state.counts(), to=to)
             
         except Exception as e:
             print(f"Error getting device status: {e}")
-            self.socketio.emit('error', {'message': f'Error getting device status: {str(e)}'})
+            self.socketio.emit('error', {'message': f'Error getting device status: {str(e)}'}, to=to)
 
     def start_scan(self):
         """Start network scan with real-time progress"""
         if self.scan_in_progress:
-            self.socketio.emit('scan_error', {'message': 'Scan already in progress'})
+            self.publish('scan', 'scan_error', {'message': 'Scan already in progress'})
             return
             
+        cancel = ScanCancelToken()
+        self.scan_cancel = cancel
+        self.scan_in_progress = True
+        scan_id = uuid.uuid4().hex[:12]
+        
         def scan_with_progress():
             try:
-                self.scan_in_progress = True
-                self.socketio.emit('scan_started', {
+                self.publish('scan', 'scan_started', {
                     'message': 'Network scan started', 
+                    'scan_id': scan_id,
                     'timestamp': datetime.now().isoformat()
                 })
                 
                 network_ranges = self.scanner.get_network_ranges()
-                all_devices = []
+                found_ids = self._start_scan_results(scan_id)
+                device_ids_by_range = {}
+                events = ScanEventBatcher(self, scan_id)
+                
+                self.publish('scan', 'scan_progress', {
+                    'progress': 0,
+                    'current_range': ', '.join(network_ranges),
+                    'message': f'Scanning {len(network_ranges)} network range(s)...'
+                })
                 
-                for i, network_range in enumerate(network_ranges):
-                    self.socketio.emit('scan_progress', {
-                        'progress': int((i / len(network_ranges)) * 100),
+                def range_complete(network_range, found, completed, total):
+                    self.publish('scan', 'scan_progress', {
+                        'progress': int((completed / total) * 100),
                         'current_range': network_range,
-                        'message': f'Scanning {network_range}...'
+                        'message': f'Finished {network_range} ({completed}/{total})'
                     })
                     
-                    # Scan this range
-                    if self.scanner.detect_wsl2():
-                        devices = self.scanner.wsl2_ping_scan(network_range)
-                    else:
-                        devices = self.scanner.ping_scan(network_range)
-                    
-                    # Process and save each discovered device
-                    for device in devices:
-                        if device['mac']:
-                            device_id = add_device(
-                                mac_address=device['mac'],
-                                ip_address=device['ip'],
-                                hostname=device['hostname'],
-                                vendor=device['vendor']
-                            )
-                            device['id'] = device_id
-                            all_devices.append(device)
-                            
-                            self.socketio.emit('device_discovered', {
-                                'device': device,
-                                'total_found': len(all_devices)
-                            })
-                    
-                    if devices:
-                        self.socketio.emit('scan_devices_found', {
-                            'devices': devices,
+                    # The devices themselves went out in devices_discovered batches
+                    events.flush()
+                    device_ids = device_ids_by_range.pop(network_range, [])
+                    if device_ids:
+                        self.publish('scan', 'scan_devices_found', {
+                            'scan_id': scan_id,
+                            'device_ids': device_ids,
                             'range': network_range,
-                            'count': len(devices)
+                            'count': len(device_ids)
                         })
                 
-                self.socketio.emit('scan_complete', {
-                    'message': f'Network scan completed! Found {len(all_devices)} devices.',
-                    'devices_found': len(all_devices),
-                    'devices': all_devices
+                # Scan all ranges concurrently; save and announce devices as they arrive
+                for batch in self.scanner.scan_batches(network_ranges, on_range_complete=range_complete, cancel=cancel):
+                    saved = {row['mac_address']: row for row in add_devices(batch)}
+                    for device in batch:
+                        device['id'] = saved[device['mac']]['id']
+                        device_ids_by_range.setdefault(device['range'], []).append(device['id'])
+                        found_ids.append(device['id'])
+                    events.add(batch)
+                
+                events.flush()
+                self.scanner.flush_pending_hostnames()
+                
+                if cancel.cancelled:
+                    # Devices found before the stop are already saved
+                    elapsed = cancel.elapsed()
+                    print(f"Scan cancelled after {elapsed:.2f}s with {len(found_ids)} devices saved")
+                    self.publish('scan', 'scan_cancelled', {
+                        'scan_id': scan_id,
+                        'message': f'Scan stopped. Saved {len(found_ids)} devices found before the stop.',
+                        'devices_found': len(found_ids),
+                        'cancel_seconds': round(elapsed, 3)
+                    })
+                    return
+                
+                # The devices themselves are available from get_scan_results(scan_id)
+                self.publish('scan', 'scan_complete', {
+                    'scan_id': scan_id,
+                    'message': f'Network scan completed! Found {len(found_ids)} devices.',
+                    'devices_found': len(found_ids),
+                    'batches': events.batches_sent
                 })
                 
             except Exception as e:
                 print(f"Scan error: {e}")
-                self.socketio.emit('scan_error', {'message': f'Scan failed: {str(e)}'})
+                self.publish('scan', 'scan_error', {'message': f'Scan failed: {str(e)}'})
             finally:
                 self.scan_in_progress = False
                 
         scan_thread = threading.Thread(target=scan_with_progress)
         scan_thread.daemon = True
+        self.scan_thread = scan_thread
         scan_thread.start()
 
+    def _start_scan_results(self, scan_id):
+        """Register a scan and return the list its device ids are appended to"""
+        device_ids = []
+        self.scan_results[scan_id] = device_ids
+        while len(self.scan_results) > SCAN_RESULTS_KEPT:
+            self.scan_results.popitem(last=False)
+        return device_ids
+    
+    def get_scan_results(self, scan_id):
+        """Ids of the devices found by a recent scan, or None if it is no longer kept"""
+        device_ids = self.scan_results.get(scan_id)
+        return list(device_ids) if device_ids is not None else None
+
     def get_scan_status(self):
         """Get current scan status"""
         return {
@@ -251,54 +368,46 @@ class RealtimeMonitor:
             'monitoring_active': self.monitoring_active
         }
 
-    def force_stop_scan(self):
-        """Force stop any running scan"""
-        self.scan_in_progress = False
-        self.socketio.emit('scan_error', {'message': 'Scan stopped by administrator'})
+    def force_stop_scan(self, timeout=10):
+        """Stop the running scan and wait for it to wind down
+        
+        Kills the nmap child and pending hostname lookups through the scan's
+        cancel token. scan_in_progress stays set until the scan thread has
+        saved its partial results and exited, so a new scan cannot start on
+        top of it. Returns whether the scan stopped and how long it took.
+        """
+        cancel = self.scan_cancel
+        scan_thread = self.scan_thread
+        if not self.scan_in_progress or cancel is None:
+            return {'stopped': False, 'message': 'No scan in progress'}
+        
+        cancel.cancel()
+        if scan_thread:
+            scan_thread.join(timeout)
+        
+        stopped = not (scan_thread and scan_thread.is_alive())
+        elapsed = cancel.elapsed()
+        print(f"Scan stop requested: {'stopped' if stopped else 'still stopping'} after {elapsed:.2f}s")
+        
+        return {
+            'stopped': stopped,
+            'cancel_seconds': round(elapsed, 3),
+            'message': 'Scan stopped by administrator' if stopped else 'Scan is still stopping'
+        }
 
     def get_monitoring_stats(self):
         """Get monitoring statistics"""
         try:
-            conn = get_db_connection()
-            
             # Device counts by status
-            devices = conn.execute('SELECT * FROM devices').fetchall()
-            now = datetime.now()
-            status_counts = {'online': 0, 'offline': 0, 'unknown': 0}
-            
-            for device in devices:
-                device_dict = dict(device)
-                last_seen_str = device_dict['last_seen']
-                
-                if last_seen_str:
-                    try:
-                        last_seen = datetime.fromisoformat(last_seen_str.replace('Z', '+00:00'))
-                    except:
-                        last_seen = datetime.fromisoformat(last_seen_str)
-                else:
-                    last_seen = now
-                    
-                time_diff = (now - last_seen).total_seconds()
-                
-                if time_diff < 3600:
-                    status_counts['online'] += 1
-                elif time_diff < 86400:
-                    status_counts['unknown'] += 1
-                else:
-                    status_counts['offline'] += 1
+            status_counts = self.device_state.counts()
             
             # Recent activity
-            recent_devices = conn.execute('''
-                SELECT COUNT(*) as count FROM devices 
-                WHERE datetime(first_seen) > datetime('now', '-24 hours')
-            ''').fetchone()
-            
-            conn.close()
+            recent_devices = self.device_state.discovered_since(epoch_ago(86400))
             
             return {
                 'status_counts': status_counts,
-                'total_devices': len(devices),
-                'devices_discovered_24h': recent_devices['count'],
+                'total_devices': sum(status_counts.values()),
+                'devices_discovered_24h': recent_devices,
                 'monitoring_active': self.monitoring_active,
                 'scan_in_progress': self.scan_in_progress
             }
@@ -0,0 +1,111 @@
+import threading
+import time
+
+# A batch goes out once it is this big, or this long after the previous one
+SCAN_EVENT_BATCH_SIZE = 200
+SCAN_EVENT_MIN_INTERVAL = 0.25
+
+# Hold batches back while any client has more than this many packets queued,
+# but never for longer than SCAN_EVENT_MAX_HOLD seconds
+SCAN_EVENT_MAX_QUEUE = 32
+SCAN_EVENT_MAX_HOLD = 5.0
+
+class ScanEventBatcher:
+    """Coalesce discovered devices into devices_discovered events
+
+    Devices are sent exactly once, in batches bounded by size and time, to the
+    'scan' topic room. Later scan events refer to them by device id. When a
+    connected client's outgoing queue backs up, batches are held and merged
+    so that slow browsers get fewer, larger frames instead of a growing
+    backlog. A batch that is held or rate limited is sent by a timer once it
+    is due, even if no more devices arrive. With no one subscribed to scans,
+    nothing is built or sent.
+    """
+
+    def __init__(self, monitor, scan_id):
+        self.monitor = monitor
+        self.socketio = monitor.socketio
+        self.scan_id = scan_id
+        self.total_found = 0
+        self.batches_sent = 0
+        self._pending = []
+        self._pending_since = None
+        self._last_emit = 0
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def add(self, devices):
+        if not devices:
+            return
+        with self._lock:
+            if not self.monitor.has_subscribers('scan'):
+                self.total_found += len(devices)
+                return
+            if not self._pending:
+                self._pending_since = time.monotonic()
+            self._pending.extend(devices)
+            self._maybe_flush()
+
+    def flush(self):
+        """Send everything still pending, backlog or not, and stop the flush timer"""
+        with self._lock:
+            self._cancel_timer()
+            self._maybe_flush(force=True)
+
+    def _maybe_flush(self, force=False):
+        if not self._pending:
+            return
+
+        now = time.monotonic()
+        if not force:
+            interval_left = SCAN_EVENT_MIN_INTERVAL - (now - self._last_emit)
+            if len(self._pending) < SCAN_EVENT_BATCH_SIZE and interval_left > 0:
+                self._flush_after(interval_left)
+                return
+            hold_left = SCAN_EVENT_MAX_HOLD - (now - self._pending_since)
+            if hold_left > 0 and self._client_backlog() > SCAN_EVENT_MAX_QUEUE:
+                # Let slow clients catch up, checking again shortly
+                self._flush_after(min(SCAN_EVENT_MIN_INTERVAL, hold_left))
+                return
+
+        pending, self._pending = self._pending, []
+        for i in range(0, len(pending), SCAN_EVENT_BATCH_SIZE):
+            if i:
+                self.socketio.sleep(0)  # Let the sockets drain between frames
+            devices = pending[i:i + SCAN_EVENT_BATCH_SIZE]
+            self.total_found += len(devices)
+            self.batches_sent += 1
+            self.socketio.emit('devices_discovered', {
+                'scan_id': self.scan_id,
+                'batch': self.batches_sent,
+                'devices': devices,
+                'total_found': self.total_found
+            }, to='scan')
+        self._last_emit = time.monotonic()
+
+    def _flush_after(self, delay):
+        """Try to send again after delay seconds unless a retry is already due"""
+        if self._timer is None:
+            self._timer = threading.Timer(delay, self._on_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _on_timer(self):
+        with self._lock:
+            if self._timer is not threading.current_thread():
+                return  # Stopped by flush() while waiting for the lock
+            self._timer = None
+            self._maybe_flush()
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _client_backlog(self):
+        """Deepest outgoing packet queue among connected clients (0 if unknown)"""
+        try:
+            sockets = list(self.socketio.server.eio.sockets.values())
+            return max((socket.queue.qsize() for socket in sockets), default=0)
+        except Exception:
+            return 0
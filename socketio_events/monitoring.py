@@ -1,6 +1,6 @@
 # socketio_events/monitoring.py
 
-from flask_socketio import emit
+from flask_socketio import emit, join_room, leave_room
 from flask import request
 import json
 
@@ -12,11 +12,24 @@ def register_monitoring_events(socketio, realtime_monitor):
         """Send current device status to requesting client"""
         print(f"Device status requested by client: {request.sid}")
         try:
-            realtime_monitor.send_current_status()
+            realtime_monitor.send_current_status(to=request.sid)
         except Exception as e:
             print(f"Error sending device status: {e}")
             emit('error', {'message': f'Error getting device status: {str(e)}'})
 
+    @socketio.on('request_status_sync')
+    def handle_status_sync_request(data=None):
+        """Send a (re)connecting client the status deltas it missed, or a snapshot"""
+        try:
+            since = (data or {}).get('since')
+            emit('device_status_sync', realtime_monitor.get_status_sync(
+                since if isinstance(since, int) else None,
+                (data or {}).get('boot_id')
+            ))
+        except Exception as e:
+            print(f"Error syncing device status: {e}")
+            emit('error', {'message': f'Error syncing device status: {str(e)}'})
+
     @socketio.on('request_monitoring_stats')
     def handle_monitoring_stats_request():
         """Send comprehensive monitoring statistics to client"""
@@ -90,38 +103,20 @@ def register_monitoring_events(socketio, realtime_monitor):
         """Send current network health metrics to client"""
         print(f"Network health requested by client: {request.sid}")
         try:
-            from backend.database import get_db_connection
             from datetime import datetime
             
-            conn = get_db_connection()
-            
-            # Get device status distribution
-            device_status = conn.execute('''
-                SELECT 
-                    CASE 
-                        WHEN datetime(last_seen) > datetime('now', '-1 hour') THEN 'online'
-                        WHEN datetime(last_seen) > datetime('now', '-1 day') THEN 'unknown'
-                        ELSE 'offline'
-                    END as status,
-                    COUNT(*) as count
-                FROM devices
-                WHERE is_ignored = 0
-                GROUP BY status
-            ''').fetchall()
+            # Status distribution of devices that are not ignored, from the device state cache
+            status_counts = realtime_monitor.device_state.counts(include_ignored=False)
+            device_status = [{'status': status, 'count': count} for status, count in status_counts.items() if count]
             
             # Calculate health score
-            total_devices = conn.execute('SELECT COUNT(*) as count FROM devices WHERE is_ignored = 0').fetchone()['count']
-            online_devices = conn.execute('''
-                SELECT COUNT(*) as count FROM devices 
-                WHERE is_ignored = 0 AND datetime(last_seen) > datetime('now', '-1 hour')
-            ''').fetchone()['count']
+            total_devices = sum(status_counts.values())
+            online_devices = status_counts['online']
             
             health_score = round((online_devices / total_devices * 100) if total_devices > 0 else 0, 1)
             
-            conn.close()
-            
             emit('network_health_update', {
-                'device_status': [dict(row) for row in device_status],
+                'device_status': device_status,
                 'health_score': health_score,
                 'total_devices': total_devices,
                 'online_devices': online_devices,
@@ -132,13 +127,42 @@ def register_monitoring_events(socketio, realtime_monitor):
             print(f"Error getting network health: {e}")
             emit('error', {'message': f'Error getting network health: {str(e)}'})
 
+    @socketio.on('subscribe_topics')
+    def handle_subscribe_topics(data=None):
+        """Join the topic rooms (scan, status, inventory, alerts) the client's page shows"""
+        try:
+            topics = realtime_monitor.subscribe(request.sid, (data or {}).get('topics', []))
+            for topic in topics:
+                join_room(topic)
+            
+            emit('subscription_confirmed', {'type': 'topics', 'topics': topics})
+            
+        except Exception as e:
+            print(f"Error subscribing to topics: {e}")
+            emit('error', {'message': f'Error subscribing to topics: {str(e)}'})
+
+    @socketio.on('unsubscribe_topics')
+    def handle_unsubscribe_topics(data=None):
+        """Leave topic rooms"""
+        try:
+            topics = [topic for topic in (data or {}).get('topics', []) if topic in realtime_monitor.subscribers]
+            realtime_monitor.unsubscribe(request.sid, topics)
+            for topic in topics:
+                leave_room(topic)
+            
+            emit('subscription_cancelled', {'type': 'topics', 'topics': topics})
+            
+        except Exception as e:
+            print(f"Error unsubscribing from topics: {e}")
+            emit('error', {'message': f'Error unsubscribing from topics: {str(e)}'})
+
     @socketio.on('subscribe_to_alerts')
     def handle_subscribe_alerts():
         """Subscribe client to real-time alerts"""
         print(f"Client {request.sid} subscribed to alerts")
         try:
             # Add client to alerts room for targeted notifications
-            from flask_socketio import join_room
+            realtime_monitor.subscribe(request.sid, ['alerts'])
             join_room('alerts')
             
             emit('subscription_confirmed', {
@@ -158,7 +182,7 @@ def register_monitoring_events(socketio, realtime_monitor):
         """Unsubscribe client from real-time alerts"""
         print(f"Client {request.sid} unsubscribed from alerts")
         try:
-            from flask_socketio import leave_room
+            realtime_monitor.unsubscribe(request.sid, ['alerts'])
             leave_room('alerts')
             
             emit('subscription_cancelled', {
@@ -247,18 +271,18 @@ def register_monitoring_events(socketio, realtime_monitor):
         """Send comprehensive dashboard data to client"""
         print(f"Dashboard data requested by client: {request.sid}")
         try:
-            from backend.database import get_db_connection
+            from backend.database import get_snapshot_connection, epoch_ago
             
-            conn = get_db_connection()
+            conn = get_snapshot_connection()
             
             # Get quick dashboard stats
             stats = conn.execute('''
                 SELECT 
                     (SELECT COUNT(*) FROM devices WHERE is_ignored = 0) as total_devices,
-                    (SELECT COUNT(*) FROM devices WHERE is_ignored = 0 AND datetime(last_seen) > datetime('now', '-1 hour')) as online_devices,
+                    (SELECT COUNT(*) FROM devices WHERE is_ignored = 0 AND last_seen_ts > :hour_ago) as online_devices,
                     (SELECT COUNT(*) FROM inventory WHERE deleted_at IS NULL) as inventory_items,
-                    (SELECT COUNT(*) FROM devices WHERE is_ignored = 0 AND datetime(first_seen) > datetime('now', '-24 hours')) as new_devices_24h
-            ''').fetchone()
+                    (SELECT COUNT(*) FROM devices WHERE is_ignored = 0 AND first_seen_ts > :day_ago) as new_devices_24h
+            ''', {'hour_ago': epoch_ago(3600), 'day_ago': epoch_ago(86400)}).fetchone()
             
             conn.close()
             
@@ -316,43 +340,7 @@ def register_monitoring_events(socketio, realtime_monitor):
             
             realtime_monitor.send_immediate_alerts = send_immediate_alerts
         
-        if not hasattr(realtime_monitor, 'get_device_current_status'):
-            def get_device_current_status(device_id):
-                try:
-                    from backend.database import get_db_connection
-                    from datetime import datetime
-                    
-                    conn = get_db_connection()
-                    device = conn.execute('SELECT * FROM devices WHERE id = ?', (device_id,)).fetchone()
-                    conn.close()
-                    
-                    if not device:
-                        return 'unknown'
-                    
-                    device_dict = dict(device)
-                    last_seen_str = device_dict['last_seen']
-                    
-                    if last_seen_str:
-                        try:
-                            last_seen = datetime.fromisoformat(last_seen_str.replace('Z', '+00:00'))
-                        except:
-                            last_seen = datetime.fromisoformat(last_seen_str)
-                    else:
-                        return 'unknown'
-                    
-                    time_diff = (datetime.now() - last_seen).total_seconds()
-                    if time_diff < 3600:
-                        return 'online'
-                    elif time_diff < 86400:
-                        return 'unknown'
-                    else:
-                        return 'offline'
-                        
-                except Exception:
-                    return 'unknown'
-            
-            realtime_monitor.get_device_current_status = get_device_current_status
-    
+
     # Add missing methods
     add_missing_methods_to_monitor()
     
@@ -14,6 +14,7 @@ def register_scanning_events(socketio, realtime_monitor, scanner):
     @socketio.on('disconnect')
     def handle_disconnect():
         print(f"Client disconnected: {request.sid}")
+        realtime_monitor.unsubscribe(request.sid)
 
     @socketio.on('start_network_scan')
     def handle_start_scan():
@@ -24,7 +25,13 @@ def register_scanning_events(socketio, realtime_monitor, scanner):
         
         realtime_monitor.start_scan()
 
+    @socketio.on('stop_network_scan')
+    def handle_stop_scan():
+        """Cancel the running network scan"""
+        result = realtime_monitor.force_stop_scan()
+        emit('scan_stop_result', result)
+
     @socketio.on('request_device_status')
     def handle_device_status_request():
         """Send current device status to requesting client"""
-        realtime_monitor.send_current_status()
\ No newline at end of file
+        realtime_monitor.send_current_status(to=request.sid)
\ No newline at end of file